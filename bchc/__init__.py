@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Helpers for bchc_Upload.py -- lookup tables and vectorized stages used to
+            turn a Bluegrass ARHCA workbook into a REDCap-ready dataset.
+"""
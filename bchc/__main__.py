@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""python -m bchc -- see bchc/cli.py"""
+import sys
+
+from bchc.cli import main
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Alien number (A#) normalization and duplicate / near-duplicate detection.
+
+  :notes:   Bluegrass keeps the A# in the User Defined Fields tab as a bare number, sometimes
+            typed with the 'A', dashes or spaces, and Excel hands it over as a float. Every
+            value is reduced to its digits and stored as 'Axxx-xxx-xxx'; values that cannot be
+            an A# (missing, not numeric, too short or too long, all zeros) become NaN and get a
+            reason instead.
+
+            A# mix-ups show up as one number assigned to two different patients, often where
+            the two were meant to get consecutive numbers (Axxx-xxx-056 and -057).
+            find_alien_conflicts() sorts the numbers once and reports both: exact duplicates
+            across patients, and numbers within `max_gap` of another patient's number. Adjacent
+            numbers are normal for families resettled together, so those rows are a hint for
+            resolving a duplicate (which neighbour is missing?) rather than an error.
+"""
+import numpy as np
+import pandas as pd
+
+MIN_DIGITS = 7      # older A#s have 7 digits, current ones 8 or 9
+MAX_DIGITS = 9
+
+_STRIP = r'^[Aa]|[-\s]|\.0+$'
+
+
+def format_alien_number(numbers):
+    """'Axxx-xxx-xxx' for an integer Series (NaN stays NaN)."""
+    digits = numbers.dropna().astype('int64').astype(str).str.zfill(MAX_DIGITS)
+    formatted = 'A' + digits.str[:3] + '-' + digits.str[3:6] + '-' + digits.str[6:]
+    return formatted.reindex(numbers.index)
+
+
+def normalize_alien_numbers(values, min_digits=MIN_DIGITS):
+    """
+    Normalize raw A# values.
+
+    :param values: Series as read from the Value column of the User Defined Fields tab
+    :param min_digits: fewest significant digits accepted as an A#
+    :returns: (Series of 'Axxx-xxx-xxx' strings, NaN where invalid; Series with the reason a
+               value was rejected -- 'missing', 'not a number', 'too short', 'too long',
+               'zero' -- and '' for accepted values)
+    """
+    text = values.astype(object).where(values.notna())
+    digits = text.dropna().astype(str).str.strip().str.replace(_STRIP, '', regex=True).reindex(values.index)
+    numeric = digits.str.fullmatch(r'\d+').fillna(False).astype(bool)
+    significant = digits.where(numeric).str.lstrip('0').str.len()
+
+    reason = pd.Series('', index=values.index, dtype=object)
+    reason[~numeric] = 'not a number'
+    reason[numeric & (significant < min_digits)] = 'too short'
+    reason[numeric & (significant > MAX_DIGITS)] = 'too long'
+    reason[numeric & (significant == 0)] = 'zero'
+    reason[text.isna() | (digits == '')] = 'missing'
+
+    numbers = pd.to_numeric(digits.where(reason == ''), errors='coerce')
+    return format_alien_number(numbers), reason
+
+
+def alien_integers(alien_numbers):
+    """Integer value of formatted A#s ('A012-345-678' -> 12345678); NaN stays NaN."""
+    return pd.to_numeric(alien_numbers.str.replace(r'\D', '', regex=True), errors='coerce')
+
+
+def find_alien_conflicts(frame, alien='alien_no', patient='Patient #', max_gap=1):
+    """
+    Find A#s shared by different patients and A#s within ``max_gap`` of another patient's.
+
+    :param frame: frame with the formatted A# and the Bluegrass patient number
+    :returns: DataFrame with columns kind ('duplicate' or 'adjacent'), alien_no, patient,
+              other_alien_no, other_patient, gap -- one row per conflicting pair
+    """
+    columns = ['kind', 'alien_no', 'patient', 'other_alien_no', 'other_patient', 'gap']
+    pairs = pd.DataFrame({'number': alien_integers(frame[alien]), 'patient': frame[patient]})
+    pairs = pairs.dropna().drop_duplicates().sort_values(['number', 'patient'], kind='mergesort')
+    number = pairs['number'].to_numpy(dtype='int64')
+    who = pairs['patient'].to_numpy()
+
+    left, right = [], []
+    # - The k-th neighbour in sorted order; stop once no pair that far apart is close enough
+    for k in range(1, len(number)):
+        gap = number[k:] - number[:-k]
+        close = gap <= max_gap
+        if not close.any():
+            break
+        hit = np.flatnonzero(close & (who[k:] != who[:-k]))
+        left.append(hit)
+        right.append(hit + k)
+    if not left:
+        return pd.DataFrame(columns=columns)
+    left, right = np.concatenate(left), np.concatenate(right)
+
+    gap = number[right] - number[left]
+    conflicts = pd.DataFrame({
+        'kind': np.where(gap == 0, 'duplicate', 'adjacent'),
+        'alien_no': format_alien_number(pd.Series(number[left])),
+        'patient': who[left],
+        'other_alien_no': format_alien_number(pd.Series(number[right])),
+        'other_patient': who[right],
+        'gap': gap,
+    }, columns=columns)
+    return conflicts.sort_values(['kind', 'alien_no'], ascending=[False, True], kind='mergesort') \
+        .reset_index(drop=True)
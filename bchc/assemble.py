@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Single-shot assembly of RESULT from the per-tab frames.
+
+  :notes:   Joining the tab frames onto RESULT one at a time copies the growing wide frame
+            once per join. assemble() checks all column names first, then aligns every frame
+            on the union of their Patient # indexes and concatenates them along the columns in
+            one operation, so RESULT is allocated once.
+
+            The tab frames (pivots, groupby-first) have one row per patient. The demographics
+            base can hold a patient twice (two A#s on one Patient #); concat cannot align a
+            duplicated index, so in that case the tab frames are concatenated with each other
+            and joined onto the base with a single join.
+"""
+import pandas as pd
+
+from bchc.trace import peak_rss
+
+
+def column_collisions(frames):
+    """
+    Column names that occur in more than one frame.
+
+    :param frames: list of (name, DataFrame)
+    :returns: dict of {column: [names of the frames that have it]}
+    """
+    owners = {}
+    for name, frame in frames:
+        for column in frame.columns:
+            owners.setdefault(column, []).append(name)
+    return dict((column, names) for column, names in owners.items() if len(names) > 1)
+
+
+def assemble(base, frames, sort=True, base_name='base'):
+    """
+    Outer-join ``frames`` onto ``base`` by index in one concatenation.
+
+    :param base: frame the others are joined onto (RESULT after the demographics)
+    :param frames: list of (name, DataFrame) in output column order; None frames are skipped
+    :param sort: sort the union index, as DataFrame.join(how='outer') does
+    :param base_name: name of ``base`` in collision messages and the report
+    :returns: (assembled DataFrame, report dict with a per-frame 'frames' DataFrame of rows,
+               columns and bytes, the 'result_bytes' of the assembled frame and the process
+               'peak_rss' in bytes -- None where unavailable)
+    :raises ValueError: when a column name occurs in more than one frame
+    """
+    frames = [(base_name, base)] + [(name, frame) for name, frame in frames if frame is not None]
+    collisions = column_collisions(frames)
+    if collisions:
+        raise ValueError('columns occur in more than one frame: %s' % '; '.join(
+            '%s (%s)' % (column, ', '.join(names)) for column, names in sorted(collisions.items())))
+
+    parts = [frame for _, frame in frames[1:]]
+    if not parts:
+        result = base.copy()
+    elif base.index.is_unique:
+        result = pd.concat([base] + parts, axis=1, join='outer', sort=sort)
+    else:
+        result = base.join(pd.concat(parts, axis=1, join='outer', sort=sort), how='outer', sort=sort)
+
+    report = {
+        'frames': pd.DataFrame([(name, len(frame), frame.shape[1], int(frame.memory_usage(deep=True).sum()))
+                                for name, frame in frames], columns=['frame', 'rows', 'columns', 'bytes']),
+        'result_bytes': int(result.memory_usage(deep=True).sum()),
+        'peak_rss': peak_rss(),
+    }
+    return result, report
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Batch mode -- run the upload pipeline over many monthly ARHCA workbooks
+            concurrently and merge the per-month RESULT frames into one upload set.
+
+  :notes:   Each workbook is processed in its own worker process (pipeline.process_workbook,
+            parsing its sheets in-process). A patient seen in several months appears once in
+            the combined output; which record wins is chosen by the duplicate rule:
+
+                latest    keep the record from the most recent month (default)
+                earliest  keep the record from the oldest month
+                combine   per field, keep the most recent non-empty value
+
+            Usage:  python -m bchc.batch "uploads/*/ARHCA_*.xls" -o combined.csv
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bchc.writer import write_upload_csv
+
+DUPLICATE_RULES = ('latest', 'earliest', 'combine')
+_MONTH = re.compile(r'(\d{1,2})-(\d{4})')
+_EXTENSIONS = ('.xls', '.xlsx')
+
+
+def workbook_month(path):
+    """(year, month) from an 'ARHCA_m-yyyy' file name, or None when the name has no date."""
+    match = _MONTH.search(os.path.basename(path))
+    if match is None:
+        return None
+    return int(match.group(2)), int(match.group(1))
+
+
+def find_workbooks(source):
+    """
+    List the workbooks in a directory or matching a glob pattern, oldest month first.
+
+    Workbooks without a month in their name sort after dated ones, by modification time.
+    """
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        paths = glob.glob(source)
+    paths = [path for path in paths if path.lower().endswith(_EXTENSIONS)
+             and not os.path.basename(path).startswith('~$')]     # skip Excel lock files
+    return sorted(paths, key=lambda path: (workbook_month(path) or (9999, 12), os.path.getmtime(path)))
+
+
+def run_workbook(path):
+    """Run the pipeline on one workbook and return its RESULT frame."""
+    from bchc.pipeline import process_workbook
+
+    return process_workbook(path, max_workers=1)
+
+
+def _job(path):
+    start = time.time()
+    try:
+        result = run_workbook(path)
+    except Exception as error:
+        return None, {'status': 'error', 'records': 0, 'seconds': round(time.time() - start, 3),
+                      'error': '%s: %s' % (type(error).__name__, error)}
+    return result, {'status': 'ok', 'records': len(result), 'seconds': round(time.time() - start, 3),
+                    'error': ''}
+
+
+def merge_results(results, rule='latest'):
+    """
+    Stack per-month RESULT frames and resolve alien_no seen in more than one month.
+
+    :param results: list of RESULT frames, oldest month first
+    :param rule: one of DUPLICATE_RULES
+    :returns: (combined DataFrame, list with the number of each frame's records also found
+               in another frame)
+    """
+    import numpy as np
+    import pandas as pd
+
+    if rule not in DUPLICATE_RULES:
+        raise ValueError('rule must be one of %s, not %r' % (', '.join(DUPLICATE_RULES), rule))
+    if not results:
+        return pd.DataFrame(columns=['alien_no']), []
+
+    combined = pd.concat([frame.reset_index(drop=True) for frame in results], ignore_index=True, sort=False)
+    columns = combined.columns
+    source = np.repeat(np.arange(len(results)), [len(frame) for frame in results])
+    shared = combined.duplicated('alien_no', keep=False).to_numpy()
+    overlaps = np.bincount(source[shared], minlength=len(results)).tolist()
+
+    if rule == 'combine':
+        combined = combined.groupby('alien_no', sort=False).last()      # last() skips NA
+        combined = combined.reset_index()[columns]
+    else:
+        combined = combined.drop_duplicates('alien_no', keep='last' if rule == 'latest' else 'first')
+    return combined.reset_index(drop=True), overlaps
+
+
+def run_batch(source, max_workers=None, rule='latest'):
+    """
+    Process every workbook of ``source`` concurrently and merge the results.
+
+    :param source: directory or glob pattern of ARHCA workbooks
+    :param max_workers: worker processes (default: CPU count)
+    :param rule: duplicate alien_no rule, see DUPLICATE_RULES
+    :returns: (combined RESULT frame, per-file status DataFrame)
+    """
+    import pandas as pd
+
+    paths = find_workbooks(source)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        outcomes = list(pool.map(_job, paths))
+
+    results = [result for result, _ in outcomes if result is not None]
+    combined, overlaps = merge_results(results, rule)
+    overlaps = iter(overlaps)
+
+    status = []
+    for path, (result, row) in zip(paths, outcomes):
+        month = workbook_month(path)
+        row = dict(row, file=path, month='%d-%02d' % month if month else '',
+                   shared_records=next(overlaps) if result is not None else 0)
+        status.append(row)
+    columns = ['file', 'month', 'status', 'records', 'shared_records', 'seconds', 'error']
+    return combined, pd.DataFrame(status, columns=columns)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bchc.batch',
+                                     description='Run the BCHC upload over many ARHCA workbooks and '
+                                                 'merge the results into one upload CSV.')
+    parser.add_argument('source', help='directory or glob pattern of ARHCA workbooks')
+    parser.add_argument('-o', '--output', required=True, help='combined upload CSV to write')
+    parser.add_argument('--status', help='per-file status CSV (default: <output>_status.csv)')
+    parser.add_argument('--rule', choices=DUPLICATE_RULES, default='latest',
+                        help='which record wins when an alien_no appears in several months')
+    parser.add_argument('--workers', type=int, help='worker processes (default: CPU count)')
+    args = parser.parse_args(argv)
+
+    combined, status = run_batch(args.source, args.workers, args.rule)
+    status_path = args.status or os.path.splitext(args.output)[0] + '_status.csv'
+    write_upload_csv(combined, args.output)
+    status.to_csv(status_path, index=False)
+    print(status.to_string(index=False))
+    return 0 if (status['status'] == 'ok').all() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
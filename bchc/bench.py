@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Per-stage benchmark of the pipeline on synthetic workbooks (bchc/synth.py).
+
+  :notes:   Each size is generated once, then every stage of process_sheets is timed on its
+            own -- User Defined Fields, demographics, vitals, Medcin, Orders, immunizations,
+            assembly, finish (types and lab limits) and writing the upload CSV. Times are the
+            best of `repeat` runs; memory is measured in a separate run under tracemalloc (which
+            slows Python code down) as the peak allocated during the stage above what was
+            allocated when it started. With --workbook the .xlsx is also written and parsed
+            for every size whose tabs fit in an Excel sheet.
+
+            Results are appended to a JSON lines file, one line per size and stage, tagged with
+            a run id, the git commit and the library versions. --compare sets the run against
+            an earlier one in the same file (the previous run by default) and exits with 1 when
+            a stage got slower by more than the tolerance.
+
+            Usage:  python -m bchc.bench [--sizes 1000 10000 100000] [--output bench_results.jsonl]
+                                         [--compare [RUN]] [--tolerance 0.2] [--workbook]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SIZES = (1000, 10000, 100000)
+RESULTS = 'bench_results.jsonl'
+MIN_SECONDS = 0.05      # stages faster than this are too noisy to call a regression
+
+
+def _steps():
+    """The stages of process_sheets as (name, step); a step updates the shared state and
+    returns the (rows in, rows out) of the stage."""
+    from bchc.assemble import assemble
+    from bchc.pipeline import (demographics_stage, finish_result, immunizations_stage, medcin_stage,
+                               orders_stage, user_fields_stage, vitals_stage)
+    from bchc.writer import write_upload_csv
+
+    def user_fields(state):
+        state['patients'] = user_fields_stage(state['sheets']['user_fields'])[0]
+        return len(state['sheets']['user_fields']), len(state['patients'])
+
+    def demographics(state):
+        state['result'] = demographics_stage(state['patients'], state['sheets']['demographics'])[0]
+        return len(state['sheets']['demographics']), len(state['result'])
+
+    def vitals(state):
+        state['vitals'] = vitals_stage(state['sheets']['vitals'])[0]
+        return len(state['sheets']['vitals']), len(state['vitals'])
+
+    def medcin(state):
+        state['medcin_demographics'], state['medcin'] = medcin_stage(state['sheets']['medcin'])[:2]
+        return len(state['sheets']['medcin']), len(state['medcin'])
+
+    def orders(state):
+        state['orders'] = orders_stage(state['sheets']['orders'], dict(state['lab_aliases']))[0]
+        return len(state['sheets']['orders']), len(state['orders'])
+
+    def immunizations(state):
+        state['immunizations'] = immunizations_stage(state['sheets']['immunizations'])[0]
+        return len(state['sheets']['immunizations']), len(state['immunizations'])
+
+    def assembly(state):
+        state['result'] = assemble(state['result'], state['medcin_demographics'] + [
+            ('vitals', state['vitals']), ('orders', state['orders']), ('medcin', state['medcin']),
+            ('immunizations', state['immunizations'])], base_name='demographics')[0]
+        return len(state['patients']), len(state['result'])
+
+    def finish(state):
+        rows = len(state['result'])
+        state['result'] = finish_result(state['result'])[0]
+        return rows, len(state['result'])
+
+    def write_csv(state):
+        write_upload_csv(state['result'], state['output'])
+        return len(state['result']), len(state['result'])
+
+    return [('user_fields', user_fields), ('demographics', demographics), ('vitals', vitals),
+            ('medcin', medcin), ('orders', orders), ('immunizations', immunizations),
+            ('assemble', assembly), ('finish', finish), ('write_csv', write_csv)]
+
+
+def _measure(step, state, memory):
+    gc.collect()
+    if memory:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    rows_in, rows_out = step(state)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - base if memory else None
+    return seconds, peak, rows_in, rows_out
+
+
+def run_stages(sheets, output, lab_aliases=None, repeat=1, memory=True):
+    """
+    Time (and memory-profile) every pipeline stage on parsed ``sheets``.
+
+    :param sheets: dict of {name: DataFrame}, see synth.generate_sheets or sheets.load_sheets
+    :param output: upload CSV the write stage writes
+    :param lab_aliases: alias store for the urinalysis normalizer; a copy is used in every run,
+                        so the store is neither changed nor saved
+    :param repeat: timed runs; the fastest time of each stage is kept
+    :param memory: add one run under tracemalloc for each stage's peak allocation
+    :returns: list of dicts with stage, seconds, peak_bytes (None without ``memory``),
+              rows_in and rows_out
+    """
+    from bchc.labs import load_alias_store
+
+    lab_aliases = load_alias_store() if lab_aliases is None else lab_aliases
+    steps = _steps()
+    stats = dict((name, {'stage': name, 'seconds': None, 'peak_bytes': None}) for name, _ in steps)
+    for _ in range(repeat):
+        state = {'sheets': sheets, 'output': output, 'lab_aliases': lab_aliases}
+        for name, step in steps:
+            seconds, _, rows_in, rows_out = _measure(step, state, False)
+            best = stats[name]['seconds']
+            stats[name].update(seconds=seconds if best is None else min(best, seconds),
+                               rows_in=rows_in, rows_out=rows_out)
+    if memory:
+        state = {'sheets': sheets, 'output': output, 'lab_aliases': lab_aliases}
+        tracemalloc.start()
+        try:
+            for name, step in steps:
+                stats[name]['peak_bytes'] = _measure(step, state, True)[1]
+        finally:
+            tracemalloc.stop()
+    return [stats[name] for name, _ in steps]
+
+
+def run_workbook_stages(sheets, path):
+    """Time writing ``sheets`` as an .xlsx and parsing it back (in-process, no cache)."""
+    from bchc.sheets import load_sheets
+    from bchc.synth import write_workbook
+
+    start = time.perf_counter()
+    write_workbook(sheets, path)
+    written = time.perf_counter() - start
+    start = time.perf_counter()
+    loaded = load_sheets(path, max_workers=1, use_cache=False)
+    parsed = time.perf_counter() - start
+    rows = sum(len(frame) for frame in loaded.values())
+    return [{'stage': 'write_workbook', 'seconds': written, 'peak_bytes': None, 'rows_in': rows, 'rows_out': rows},
+            {'stage': 'load_sheets', 'seconds': parsed, 'peak_bytes': None, 'rows_in': rows, 'rows_out': rows}]
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def benchmark(sizes=SIZES, repeat=1, memory=True, workbook=False, seed=0, **generator_options):
+    """
+    Benchmark every stage at each patient count in ``sizes``.
+
+    :param generator_options: passed on to synth.generate_sheets (orders, immunizations, typo_rate...)
+    :returns: list of result dicts, one per size and stage, ready for save_results
+    """
+    import numpy as np
+    import pandas as pd
+
+    from bchc.synth import EXCEL_MAX_ROWS, generate_sheets
+
+    run = {'run': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': _commit(), 'python': platform.python_version(),
+           'pandas': pd.__version__, 'numpy': np.__version__, 'seed': seed}
+    results = []
+    directory = tempfile.mkdtemp(prefix='bchc_bench_')
+    try:
+        for patients in sizes:
+            sheets = generate_sheets(patients, seed=seed, **generator_options)
+            stats = []
+            if workbook and max(len(frame) for frame in sheets.values()) < EXCEL_MAX_ROWS:
+                stats += run_workbook_stages(sheets, os.path.join(directory, 'ARHCA_%d.xlsx' % patients))
+            stats += run_stages(sheets, os.path.join(directory, 'upload_%d.csv' % patients),
+                                repeat=repeat, memory=memory)
+            for stat in stats:
+                stat = dict(run, patients=patients, **stat)
+                stat['seconds'] = round(stat['seconds'], 6)
+                results.append(stat)
+            del sheets
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def save_results(results, path=RESULTS):
+    """Append ``results`` to the JSON lines file at ``path``."""
+    with open(path, 'a', encoding='utf-8') as handle:
+        for result in results:
+            handle.write(json.dumps(result, sort_keys=True) + '\n')
+    return path
+
+
+def load_results(path=RESULTS):
+    """Every result stored at ``path`` (empty when the file does not exist)."""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as handle:
+        return [json.loads(line) for line in handle if line.strip()]
+
+
+def compare_runs(results, run, baseline=None, tolerance=0.2, min_seconds=MIN_SECONDS):
+    """
+    Set the stages of ``run`` against those of ``baseline`` (default: the run before it).
+
+    :param results: stored results, see load_results
+    :returns: DataFrame with patients, stage, baseline/current seconds and peak bytes, the time
+              ratio and a 'regression' flag -- slower by more than ``tolerance`` and taking at
+              least ``min_seconds`` -- or None when there is no baseline run
+    """
+    import pandas as pd
+
+    frame = pd.DataFrame(results)
+    runs = list(dict.fromkeys(frame['run']))
+    if baseline is None:
+        earlier = runs[:runs.index(run)]
+        if not earlier:
+            return None
+        baseline = earlier[-1]
+    keys = ['patients', 'stage']
+    columns = keys + ['seconds', 'peak_bytes']
+    merged = frame[frame['run'] == baseline][columns].merge(frame[frame['run'] == run][columns], on=keys,
+                                                            suffixes=('_baseline', '_current'))
+    merged['ratio'] = (merged.seconds_current / merged.seconds_baseline).round(3)
+    merged['regression'] = (merged.ratio > 1 + tolerance) & (merged.seconds_current >= min_seconds)
+    merged.insert(0, 'baseline', baseline)
+    return merged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bchc.bench',
+                                     description='Time and memory-profile each pipeline stage on synthetic workbooks.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help='patient counts')
+    parser.add_argument('--output', default=RESULTS, help='JSON lines file the results are appended to')
+    parser.add_argument('--repeat', type=int, default=1, help='timed runs per size (fastest is kept)')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc run')
+    parser.add_argument('--workbook', action='store_true', help='also time writing and parsing the .xlsx')
+    parser.add_argument('--orders', type=float, default=6.0, help='average order panels per patient')
+    parser.add_argument('--immunizations', type=float, default=3.0, help='average immunizations per patient')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--compare', nargs='?', const='', metavar='RUN',
+                        help='compare with an earlier run id (default: the previous run)')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='slowdown flagged as a regression')
+    args = parser.parse_args(argv)
+
+    results = benchmark(args.sizes, args.repeat, not args.no_memory, args.workbook, args.seed,
+                        orders=args.orders, immunizations=args.immunizations)
+    save_results(results, args.output)
+    for result in results:
+        peak = result['peak_bytes']
+        print('%8d  %-14s %9.3fs  %10s  %9d -> %d rows' % (
+            result['patients'], result['stage'], result['seconds'],
+            '' if peak is None else '%.1f MiB' % (peak / 2.0 ** 20), result['rows_in'], result['rows_out']))
+
+    if args.compare is not None:
+        comparison = compare_runs(load_results(args.output), results[0]['run'], args.compare or None,
+                                  args.tolerance)
+        if comparison is None:
+            print('no earlier run in %s to compare with' % args.output)
+            return 0
+        print('\ncompared with run %s:' % comparison.baseline.iloc[0])
+        print(comparison.drop(columns=['baseline']).to_string(index=False))
+        if comparison.regression.any():
+            print('%d stages slower by more than %d%%' % (comparison.regression.sum(), args.tolerance * 100),
+                  file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
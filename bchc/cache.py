@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: On-disk cache of parsed worksheets and stage outputs, keyed by the workbook's content hash.
+
+  :notes:   Rerunning the upload on the same ARHCA file (after adding a typo or a vaccine)
+            loads the parsed sheets from pickles instead of decoding the workbook again, and
+            the outputs of the stages the change did not touch (bchc/stages.py).
+            Editing or replacing the workbook changes its hash, so stale entries are never
+            read; they are evicted oldest-first once the cache outgrows its size budget.
+
+            The cache holds patient data. By default it lives in a '.bchc_cache' folder next
+            to the workbook, i.e. in the same (access-controlled) uploads directory;
+            BCHC_CACHE_DIR overrides this. Only point it at directories you trust, since the
+            entries are unpickled.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+TEMP_MAX_AGE = 3600     # seconds; an older .tmp file was left by a run that was killed while writing
+_SUFFIX = '.pkl'
+_digests = {}
+
+
+def default_cache_dir(workbook_path):
+    """Cache directory for ``workbook_path`` -- $BCHC_CACHE_DIR, or .bchc_cache beside it."""
+    return os.environ.get('BCHC_CACHE_DIR') or \
+        os.path.join(os.path.dirname(os.path.abspath(workbook_path)), '.bchc_cache')
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 hex digest of the file's contents (remembered while the file's size and mtime stay the same)."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as handle:
+            for chunk in iter(lambda: handle.read(chunk_size), b''):
+                digest.update(chunk)
+        _digests[key] = digest.hexdigest()
+    return _digests[key]
+
+
+def entry_path(cache_dir, digest, sheet):
+    """Path of the cache entry for one sheet (index or name) of the workbook ``digest``."""
+    sheet = re.sub(r'[^0-9A-Za-z_-]', '_', str(sheet))
+    return os.path.join(cache_dir, '%s-%s%s' % (digest, sheet, _SUFFIX))
+
+
+def read_entry(path):
+    """Load a cached frame (or stage output, see bchc/stages.py), or None when the entry is missing or unreadable."""
+    import pandas as pd
+
+    try:
+        frame = pd.read_pickle(path)
+    except Exception:
+        return None
+    try:
+        os.utime(path, None)    # mark as recently used for eviction
+    except OSError:
+        pass
+    return frame
+
+
+def write_entry(frame, path):
+    """Store ``frame`` -- or any picklable stage output -- atomically, so an interrupted run never leaves a
+    truncated entry."""
+    import pandas as pd
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = '%s.%d.tmp' % (path, os.getpid())
+    pd.to_pickle(frame, temp)
+    os.replace(temp, path)
+
+
+def sheet_map_path(cache_dir, digest):
+    """Path of the detected tab positions of the workbook ``digest`` (see sheets.detect_sheets)."""
+    return os.path.join(cache_dir, '%s.sheets.json' % digest)
+
+
+def read_json(path):
+    """Load a JSON entry, or None when it is missing or unreadable."""
+    try:
+        with open(path, encoding='utf-8') as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(value, path):
+    """Store ``value`` as JSON, atomically like write_entry."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = '%s.%d.tmp' % (path, os.getpid())
+    with open(temp, 'w', encoding='utf-8') as handle:
+        json.dump(value, handle)
+    os.replace(temp, path)
+
+
+def evict(cache_dir, max_bytes=CACHE_MAX_BYTES):
+    """Delete least recently used entries until the cache fits in ``max_bytes``. Temporary files
+    left by killed runs count towards the size and are deleted once older than TEMP_MAX_AGE."""
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return
+    entries, total = [], 0
+    for name in names:
+        if not name.endswith((_SUFFIX, '.tmp')):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)    # another process may have evicted it meanwhile
+        except OSError:
+            continue
+        if name.endswith('.tmp'):
+            if time.time() - stat.st_mtime > TEMP_MAX_AGE:
+                try:
+                    os.remove(path)
+                    continue
+                except OSError:
+                    pass
+            total += stat.st_size   # still being written: counted, not deleted
+        else:
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except OSError:
+            continue
+        total -= size
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Command line entry point -- convert an ARHCA workbook into a REDCap import CSV.
+
+  :notes:   Usage:  python -m bchc ARHCA_3-2018.xls [-o upload.csv] [--sheet vitals=7]
+                                   [--data-dictionary dictionary.csv] [--report review/]
+                                   [--format csv|json] [--max-rows N] [--max-bytes N] [--gzip]
+
+            Only argparse and the standard library are imported up front; pandas and the
+            pipeline are imported after the arguments have been checked, so --help and usage
+            errors answer immediately.
+"""
+import argparse
+import os
+import sys
+
+from bchc.sheets import SHEETS
+
+_REVIEW_TABLES = ('alien_invalid', 'alien_conflicts', 'vitals_bad', 'medcin_conflicts', 'lab_review',
+                  'lab_not_numeric', 'lab_out_of_range', 'order_unknown', 'immun_unknown')
+
+
+def default_output(workbook, format='csv'):
+    """refHealthUpload_<m-yyyy>.csv (or .json) beside an 'ARHCA_<m-yyyy>' workbook."""
+    stem = os.path.splitext(os.path.basename(workbook))[0]
+    if stem.upper().startswith('ARHCA_'):
+        stem = stem[len('ARHCA_'):]
+    return os.path.join(os.path.dirname(os.path.abspath(workbook)), 'refHealthUpload_%s.%s' % (stem, format))
+
+
+def parse_sheet_options(options):
+    """{name: index or sheet name} from NAME=SHEET options; raises ValueError on bad input."""
+    sheets = {}
+    for option in options or ():
+        name, sep, sheet = option.partition('=')
+        if not sep or not sheet:
+            raise ValueError('--sheet expects NAME=SHEET, not %r' % option)
+        if name not in SHEETS:
+            raise ValueError('unknown sheet %r (choose from %s)' % (name, ', '.join(sorted(SHEETS))))
+        sheets[name] = int(sheet) if sheet.isdigit() else sheet
+    return sheets
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m bchc',
+                                     description='Convert a Bluegrass ARHCA workbook into a REDCap import CSV.')
+    parser.add_argument('workbook', help='.xls/.xlsx ARHCA workbook')
+    parser.add_argument('-o', '--output', help='upload CSV to write (default: refHealthUpload_<m-yyyy>.csv '
+                                               'beside the workbook)')
+    parser.add_argument('--sheet', action='append', metavar='NAME=SHEET',
+                        help='tab position or name of a required sheet whose header row is not recognised, '
+                             'e.g. --sheet vitals=7 (names: %s)' % ', '.join(sorted(SHEETS)))
+    parser.add_argument('--workers', type=int, help='sheet parser processes (1 parses in-process)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always re-parse the workbook and rerun every stage')
+    parser.add_argument('--cache-dir', help='cache of parsed sheets and stage outputs '
+                                            '(default: .bchc_cache beside the workbook)')
+    parser.add_argument('--stream-orders', action='store_true',
+                        help='read the Orders tab in chunks, filtering rows as they are read (large workbooks)')
+    parser.add_argument('--chunk-size', type=int, default=50000, help='Orders rows per chunk with --stream-orders')
+    parser.add_argument('--vitals-encounter', choices=('first', 'last'), default='first',
+                        help='upload the vitals of the earliest (default) or latest encounter')
+    parser.add_argument('--medcin-conflict', choices=('blank', 'first', 'last'), default='blank',
+                        help='a Medcin question answered differently is left blank (default) or takes the '
+                             'answer of the first or last row')
+    parser.add_argument('--format', choices=('csv', 'json'), default='csv',
+                        help='upload file format: csv for the Data Import Tool (default) or REDCap json')
+    parser.add_argument('--max-rows', type=int, help='split the upload into files of at most this many records')
+    parser.add_argument('--max-bytes', type=int, help='split the upload into files of at most this many bytes')
+    parser.add_argument('--gzip', action='store_true', help='gzip the upload file(s)')
+    parser.add_argument('--data-dictionary', metavar='CSV', help='validate RESULT against this REDCap data dictionary')
+    parser.add_argument('--report', metavar='DIR', help='write the review tables to DIR as CSV files')
+    parser.add_argument('--trace', metavar='JSONL', help='append the time, memory growth and rows in/out of '
+                                                         'every step to this JSON lines file')
+    parser.add_argument('--chrome-trace', metavar='JSON', help='also write the steps as a Chrome trace '
+                                                               '(chrome://tracing, ui.perfetto.dev)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only print errors')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        sheets = parse_sheet_options(args.sheet)
+    except ValueError as error:
+        parser.error(str(error))
+    if not os.path.isfile(args.workbook):
+        parser.error('workbook not found: %s' % args.workbook)
+    if args.data_dictionary and not os.path.isfile(args.data_dictionary):
+        parser.error('data dictionary not found: %s' % args.data_dictionary)
+
+    from bchc.pipeline import process_workbook
+    from bchc.sheets import detect_sheets
+    from bchc.trace import NULL_TRACER, Tracer
+
+    try:
+        sheets.update(detect_sheets(args.workbook, [name for name in SHEETS if name not in sheets],
+                                    use_cache=not args.no_cache, cache_dir=args.cache_dir))
+    except ValueError as error:
+        parser.error(str(error))
+    from bchc.writer import write_upload
+
+    report = {}
+    tracer = Tracer(args.trace, args.chrome_trace) if args.trace or args.chrome_trace else NULL_TRACER
+    try:
+        result = process_workbook(args.workbook, sheets, max_workers=args.workers, use_cache=not args.no_cache,
+                                  cache_dir=args.cache_dir, report=report, tracer=tracer,
+                                  stream=args.stream_orders, chunk_size=args.chunk_size,
+                                  vitals_encounter=args.vitals_encounter, medcin_conflict=args.medcin_conflict)
+        output = args.output or default_output(args.workbook, args.format)
+        outputs = write_upload(result, output, args.format, max_rows=args.max_rows, max_bytes=args.max_bytes,
+                               compress=args.gzip, tracer=tracer)
+    finally:
+        tracer.close()
+
+    errors = None
+    if args.data_dictionary:
+        from bchc.validate import compile_checks, load_data_dictionary, validate_records
+        errors = validate_records(result, compile_checks(load_data_dictionary(args.data_dictionary)))
+        report['validation_errors'] = errors
+
+    if args.report:
+        os.makedirs(args.report, exist_ok=True)
+        for name in _REVIEW_TABLES + ('validation_errors',):
+            if name in report:
+                report[name].to_csv(os.path.join(args.report, name + '.csv'), index=False)
+
+    if not args.quiet:
+        print('%d records written to %s' % (len(result), ', '.join(outputs)))
+        reused = [stage for stage, status in report['stages'].items() if status == 'reused']
+        if reused:
+            print('reused from the cache: %s' % ', '.join(reused))
+        for name in _REVIEW_TABLES:
+            if len(report[name]):
+                print('%s: %d rows' % (name, len(report[name])))
+        for stage, fields in report['unmapped'].items():
+            for field, values in fields.items():
+                print('unmapped %s.%s: %s' % (stage, field, values))
+    if errors is not None and len(errors):
+        print('%d validation errors (%s)' % (len(errors), ', '.join(sorted(errors.field.unique()))),
+              file=sys.stderr)
+        return 1
+    return 0
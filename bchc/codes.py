@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: REDCap choice codes for the coded BCHC fields and a table-driven encoder.
+
+  :notes:   Each table maps a REDCap field to {raw Bluegrass value: REDCap code}. Raw values
+            are matched after stripping leading/trailing whitespace, so 'MEDICAID ' and
+            'MEDICAID' need only one entry. When Bluegrass sends a new insurer or a new typo,
+            add it to the table here -- the encoder reports anything it could not map.
+            A code of None means the value is uploaded as a blank.
+"""
+import numpy as np
+import pandas as pd
+
+# - Medcin answers
+YES_NO = {'N': 0, 'Y': 1}
+YES_NO_NONE = dict(YES_NO, **{'None': 2})
+NO_DOCUMENTATION = 'No documentation but patient reports treatment'
+
+MEDCIN_CODES = {
+    'nw_betel_nut': YES_NO,
+    'nw_bld_tx': YES_NO_NONE,
+    'ovs_class_btb': YES_NO_NONE,
+    'nw_breastfeeding': YES_NO,
+    'ovs_mntl_hlth': YES_NO_NONE,
+    'seh_exprcd_torture_yn': YES_NO,
+    'seh_wtnss_torture_yn': YES_NO,
+    'ovs_malaria': dict(YES_NO_NONE, **{'Not Indicated': 3, NO_DOCUMENTATION: 4}),
+    'ovs_intstnl_parasites': dict(YES_NO, **{'None': 3, NO_DOCUMENTATION: 4}),
+    'seh_rglr_meds_vit_yn': YES_NO,
+    'secondary_migrant': YES_NO,
+    'nw_strt_drugs_yn': YES_NO,
+    'nw_tattoo': YES_NO,
+    'seh_faith_yn': YES_NO,
+    'nw_injctd_drgs': YES_NO,
+    'nw_ethoh_yn': YES_NO,
+    'nw_chews_yn': YES_NO,
+    'nw_smokes_yn': YES_NO,
+    'nw_pregnant': YES_NO,
+    'nw_sexually_act': YES_NO,
+}
+
+# - Demographics
+MEDICAID_PLANS = [
+    'WELLCARE OF KENTUCKY',
+    'WELLCARE MEDICAID OF KENTUCKY',
+    'PASSPORT HEALTH PLAN',
+    'HUMANA CARESOURCE KY MEDICAID',
+    'COVENTRY CARES OF KY',
+    'AETNA BETTER HEALTH OF KENTUCKY',
+    'ANTHEM KENTUCKY MEDICAID',
+    'ANTHEM BCBS MEDICAID',
+    'BEACON HEALTH',
+    'HUMANA CARESOURCE MEDICARE ADVANTAGE',
+    'MEDICAID',
+    'BLUE CROSS BLUE SHIELD',
+]
+
+DEMOGRAPHIC_CODES = {
+    'health_insurance': dict.fromkeys(MEDICAID_PLANS, 2),
+    'gender': {'M': 1, 'F': 2},
+    'marriage_status': {
+        'MARRIED': 1,
+        'DIVORCED': 2,
+        'WIDOWED': 3,
+        'SEPARATED': 4,
+        'SINGLE': 5,
+        'SINGLE LIVING WITH PARTNER': 6,
+        'UNKNOWN': None,
+    },
+    'resettlement_agency': {'KRM': 3},
+}
+
+# - Orders results with fixed answers
+REACTIVE = {'Not Performed': None, 'NON-REACTIVE': 0, 'REACTIVE': 1, 'BORDERLINE': 2}
+
+ORDER_CODES = {
+    'lab_pregnant_rslt': {'Not Performed': None, 'Negative': 0, 'Positive': 1},
+    'lab_hbcab': REACTIVE,
+    'lab_hbsab': REACTIVE,
+    'lab_hbsag': REACTIVE,
+    'lab_syphilis_rslts': {'NON-REACTIVE': 0, 'REACTIVE': 1},
+}
+
+
+def encode_column(values, mapping, strip=True):
+    """
+    Encode a column through ``mapping`` with one pass over its distinct values.
+
+    The column is factorized, each distinct value is looked up once, and the codes are
+    scattered back to the rows with a single take. Values missing from ``mapping`` are
+    passed through unchanged and returned so the caller can report them.
+
+    :param values: pandas Series of raw values
+    :param mapping: dict of {raw value: REDCap code}
+    :param strip: strip whitespace from string values before the lookup
+    :returns: (encoded Series, list of unmapped values)
+    """
+    codes, uniques = pd.factorize(values)
+    keys = np.asarray(uniques, dtype=object)
+    if strip:
+        keys = np.array([key.strip() if isinstance(key, str) else key for key in keys], dtype=object)
+
+    lookup = np.empty(len(keys) + 1, dtype=object)
+    unmapped = []
+    for i, key in enumerate(keys):
+        if key in mapping:
+            lookup[i] = mapping[key]
+        else:
+            lookup[i] = key
+            unmapped.append(key)
+    lookup[-1] = np.nan     # factorize marks missing values with -1, which indexes this slot
+    return pd.Series(lookup[codes], index=values.index, name=values.name), unmapped
+
+
+def encode_choices(frame, table, strip=True):
+    """
+    Encode every field of ``table`` that is present in ``frame``.
+
+    :param frame: DataFrame holding raw Bluegrass values
+    :param table: dict of {REDCap field: {raw value: code}}, e.g. MEDCIN_CODES
+    :param strip: strip whitespace from string values before the lookup
+    :returns: (encoded copy of frame, dict of {field: [unmapped values]})
+    """
+    encoded = frame.copy()
+    unmapped = {}
+    for field, mapping in table.items():
+        if field in encoded:
+            encoded[field], missing = encode_column(encoded[field], mapping, strip)
+            if missing:
+                unmapped[field] = missing
+    return encoded, unmapped
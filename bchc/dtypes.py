@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Compact column types for RESULT -- nullable small ints for codes and flags,
+            float32 for labs and vitals, categoricals for the remaining repeated text.
+
+  :notes:   Up to assembly the tab frames carry object columns mixing ints, digit strings,
+            '' and NaN. compact_result() settles every column on one dtype with proper NA:
+
+                LAB_FIELDS / VITAL_FIELDS   float32 (text such as 'Not Performed' -> NA)
+                COUNT_FIELDS                Int16   (blood pressure, RHS-15 score)
+                DATE_FIELDS                 datetime64 (unparseable -> NaT)
+                TEXT_FIELDS                 left as text
+                anything else               Int8 when every value is a small integer code
+                                            or flag, otherwise category
+
+            Empty strings count as missing. REDCap's blank-cell convention is applied only
+            when the file is written (bchc/writer.py), never inside the frame.
+"""
+import numpy as np
+import pandas as pd
+
+LAB_FIELDS = (
+    'alr_cmp_albumin', 'alr_cmp_alt', 'alr_cmp_ast', 'alr_cmp_bilirubin', 'alr_cmp_ca',
+    'alr_cmp_cl', 'alr_cmp_creatinine', 'alr_cmp_glucose', 'alr_cmp_k', 'alr_cmp_ldl',
+    'alr_cmp_na', 'alr_cmp_ttlprotein', 'alr_cmp_tryglycde', 'lab_cholesterol_rslt',
+    'lab_hdl_rslt', 'lab_hematocrit', 'lab_hemoglobin', 'lab_mcv', 'lab_platelet', 'lab_rdw',
+    'lab_wbc',
+)
+VITAL_FIELDS = ('vsd1_height', 'vsd1_weight')
+COUNT_FIELDS = ('vsd1_sys_bp', 'vsd1_dia_bp', 'rhs15_score')
+DATE_FIELDS = ('date_of_birth', 'us_arrival_date')
+TEXT_FIELDS = ('alien_no', 'name', 'zip_code', 'cntry_dept', 'cntry_origin', 'prefered_language_other',
+               'vsd1_vision_both', 'vsd1_vision_left', 'vsd1_vision_right')
+
+_INT8 = np.iinfo(np.int8)
+
+
+def _blank_to_na(values):
+    """Strip text and turn empty strings into NA; non-text values are left alone."""
+    if values.dtype != object and not pd.api.types.is_string_dtype(values):
+        return values
+    stripped = values.map(lambda value: value.strip() if isinstance(value, str) else value)
+    return stripped.mask(stripped == '')
+
+
+def to_number(values, dtype='float32'):
+    """Numeric column of ``dtype``; values that are not numbers become NA."""
+    values = pd.to_numeric(_blank_to_na(values), errors='coerce')
+    if dtype.startswith('float'):
+        return values.astype(dtype)
+    return values.round().astype(dtype)
+
+
+def infer_compact(values):
+    """Int8 when every value is an integer code in int8 range, otherwise category."""
+    values = _blank_to_na(values)
+    if pd.api.types.is_bool_dtype(values):
+        return values.astype('Int8')
+    numbers = pd.to_numeric(values, errors='coerce')
+    present = values.notna()
+    if (numbers.notna() == present).all():
+        known = numbers[present]
+        if ((known % 1 == 0) & (known >= _INT8.min) & (known <= _INT8.max)).all():
+            return numbers.astype('Int8')
+    return values.astype('category')
+
+
+def compact_result(frame):
+    """
+    Convert every column of ``frame`` to its compact dtype (see the module notes).
+
+    :returns: converted copy of ``frame``
+    """
+    columns = {}
+    for column in frame.columns:
+        values = frame[column]
+        if column in LAB_FIELDS or column in VITAL_FIELDS:
+            columns[column] = to_number(values, 'float32')
+        elif column in COUNT_FIELDS:
+            columns[column] = to_number(values, 'Int16')
+        elif column in DATE_FIELDS:
+            columns[column] = pd.to_datetime(_blank_to_na(values), errors='coerce')
+        elif column in TEXT_FIELDS:
+            columns[column] = _blank_to_na(values)
+        else:
+            columns[column] = infer_compact(values)
+    return pd.DataFrame(columns, index=frame.index, columns=frame.columns)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Declarative exclude lists for the Medcin, Orders and Immunizations tabs and a
+            filter that applies a whole list in one pass.
+
+  :notes:   Entries are plain substrings, matched case-sensitively like the original
+            str.contains() chain ('MCH' also removes 'MCHC', 'RED' removes 'RED CELL ...').
+            Before adding an entry, make sure the same word isn't used in a relevant cell.
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# - Medcin Description rows that are not stored in REDCap
+MEDCIN_EXCLUDE = [
+    'STRONGYLOIDIASIS', 'Strongyloidiasis', 'summary', 'Anthelmintics', 'Ivermectin',
+    'Praziquantel', 'screened', 'Schistosomiasis', 'Immigration', 'method', 'Presumptive',
+    'under',
+]
+
+# - Medcin rows holding demographics; split out into DF_MED1-4 before the Medcin pivot
+MEDCIN_DEMOGRAPHICS = ['Country', 'Arrival', 'language']
+
+# - Order Description rows that are not stored in REDCap
+ORDER_EXCLUDE = ['ASSAY', 'PURE', 'RPR', 'VARICELLA', 'RHS-15']
+
+# - Result Component rows that are not stored in REDCap
+RESULT_COMPONENT_EXCLUDE = [
+    'ABSOLUTE', 'MCH', 'MCHC', 'MPV', 'BASOPHILS', 'COMMENT', 'LYMPHOCYTES', 'MONOCYTES',
+    'MYELOCYTES', 'PROMYELOCYTES',
+    'eGFR', 'Specific Gravity', 'ESTIMATION', 'CONFIRMATION', 'BUN', 'Nitrite', 'NUCLEATED',
+    'GLOBULIN', 'ALKALINE PHOSPHATASE', 'NEUTROPHILS',
+    'CARBON DIOXIDE', 'MORPHOLOGY', 'CHOL/HDLC', 'NON-HDL CHOLESTEROL', 'CONCENTRATE',
+    'TRICHROME', 'TSPOT', 'Bilirubin', 'BLASTS', 'EOSINOPHILS',
+    'Ketones', 'Leukocytes', 'Urobilinogen', 'pH', 'RED', 'QUESTION', 'CONTAINER',
+    'RESOLUTION', 'MESSAGE:', 'FECAL',
+]
+
+# - Immunizations Description rows that are not vaccines
+IMMUN_EXCLUDE = ['IMMUNIZATION']
+
+
+@lru_cache(maxsize=32)
+def _compile(patterns):
+    return re.compile('|'.join(re.escape(pattern) for pattern in patterns))
+
+
+def compile_excludes(patterns):
+    """Compile an exclude list into a single alternation matcher (cached per list)."""
+    return _compile(tuple(patterns))
+
+
+def exclude_mask(values, patterns, unique_only=True):
+    """
+    Build one boolean mask of the rows whose value contains any of ``patterns``.
+
+    :param values: pandas Series of strings
+    :param patterns: list of substrings to exclude
+    :param unique_only: match each distinct value once and broadcast the result back to the
+                        rows, instead of running the matcher over every row
+    :returns: (mask Series, hits Series of {pattern: matching rows}) -- missing values are
+              treated as matches, as the original `str.contains(...) == False` filters did
+    """
+    matcher = compile_excludes(patterns)
+    codes, uniques = pd.factorize(values)
+    uniques = np.asarray(uniques, dtype=object)
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+
+    if unique_only:
+        matched = np.fromiter((matcher.search(str(value)) is not None for value in uniques),
+                              dtype=bool, count=len(uniques))
+        mask = np.append(matched, True)[codes]      # code -1 (missing) picks the trailing True
+    else:
+        mask = values.str.contains(matcher, na=True).to_numpy(dtype=bool)
+        matched = np.zeros(len(uniques), dtype=bool)
+        matched[codes[mask & (codes >= 0)]] = True
+
+    # - hit counts only need the distinct values that matched at all
+    hits = dict.fromkeys(patterns, 0)
+    for value, count in zip(uniques[matched], counts[matched]):
+        value = str(value)
+        for pattern in patterns:
+            if pattern in value:
+                hits[pattern] += int(count)
+    return pd.Series(mask, index=values.index), pd.Series(hits, dtype='int64')
+
+
+def exclude_rows(frame, column, patterns, unique_only=True):
+    """
+    Drop the rows of ``frame`` whose ``column`` contains any of ``patterns``.
+
+    The whole list is applied in a single pass and the frame is copied once.
+
+    :returns: (filtered DataFrame, hits Series of {pattern: rows that pattern matched})
+    """
+    mask, hits = exclude_mask(frame[column], patterns, unique_only)
+    return frame[~mask.to_numpy()], hits
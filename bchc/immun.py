@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Vaccine alias registry for the Immunizations tab and the aggregation that counts
+            its rows into REDCap's imm_*/oi_* fields.
+
+  :notes:   Bluegrass names the same vaccine differently from month to month (VFC stock,
+            syringe size, age band). Every description maps to the REDCap field(s) it counts
+            toward; combination vaccines feed several fields. Descriptions are matched after
+            stripping whitespace. A description that is in neither VACCINE_REGISTRY nor
+            IGNORED_DESCRIPTIONS ends up in the unknown report -- add it here and rerun.
+"""
+from bchc.indicators import count_pairs
+
+VACCINE_REGISTRY = {
+    # - Varicella
+    'CHICKEN POX VACCINE, SC (VARIVAX)': ('imm_varicella',),
+    'CHICKEN POX (VFC) VACCINE, SC': ('imm_varicella',),
+    'MMRV (VFC) VACCINE, SC': ('imm_varicella', 'imm_mmr'),
+    # - DTAP
+    'DTAP (VFC) VACCINE, < 7 YRS, IM': ('imm_dtap_dtp_dose1',),
+    'DTAP-HEP B-IPV (VFC) VACCINE, IM': ('imm_dtap_dtp_dose1', 'imm_hepb_d1', 'imm_polio_dose1'),
+    'DTAP-HIB-IPV (VFC) VACCINE, IM': ('imm_dtap_dtp_dose1', 'imm_polio_dose1'),
+    'DTAP-IPV (VFC) VACC 4-6 YR IM': ('imm_dtap_dtp_dose1', 'imm_polio_dose1'),
+    # - Influenza
+    'FLU VACC 4 VAL 3 YRS PLUS IM': ('imm_flu',),
+    'FLU VACCINE 6-35 MO (VFC), TRIVALENT, PRESERVATIVE FREE': ('imm_flu',),
+    'FLUMIST (VFC) VACCINE, NASAL VFC': ('imm_flu',),
+    'FLUARIX .5 ML SYRINGE 3 YRS+': ('imm_flu',),
+    'FLUVIRIN .5 ML SYRINGE 4+YRS': ('imm_flu',),
+    'FLUZONE .25 ML SYRINGE 6-35 MONTHS': ('imm_flu',),
+    'FLUZONE (VFC) 4 VAL 3 YRS+': ('imm_flu',),
+    'FLUZONE 3 YRS+ 0.5 ML SYRINGE': ('imm_flu',),
+    'FLULAVAL (IIV4) 0.5 ML SYRINGE': ('imm_flu',),
+    'IIV4 VACCINE 3 YRS PLUS IM': ('imm_flu',),
+    # - Hep A
+    'HEP A (VFC) VACC, PED/ADOL, 2 DOSE': ('oi_hepa',),
+    # - Hep B
+    'HEP B VACCINE, ADULT, IM': ('imm_hepb_d1',),
+    'HEPB (VFC) VACC PED/ADOL 3 DOSE IM': ('imm_hepb_d1',),
+    'HEPB VACC PED/ADOL 3 DOSE IM': ('imm_hepb_d1',),
+    # - Hib
+    'HIB (VFC) VACCINE, PRP-T, IM': ('oi_hib',),
+    # - HPV
+    'HPV VACCINE 9 VALENT IM': ('oi_hpv',),
+    # - Meningococcal
+    'MENINGOCOCCAL (VFC) VACCINE, IM': ('imm_mening',),
+    'MENINGOCOCCAL GRP B VFC (10-25 YRS)': ('imm_mening',),
+    # - MMR
+    'MMR (VFC) VACCINE, SC': ('imm_mmr',),
+    'MMR VACCINE, SC': ('imm_mmr',),
+    # - Pneumococcal
+    'PNEUMOCOCCAL (VFC) VACC 13 VAL IM VFC': ('imm_pneumo',),
+    'PNEUMOCOCCAL VACC 13 VAL IM': ('imm_pneumo',),
+    'PNEUMO VACC 23 VAL IM': ('imm_pneumo',),
+    # - Polio
+    'POLIOVIRUS (VFC), IPV, SC/IM': ('imm_polio_dose1',),
+    # - TDAP
+    'TDAP (VFC) VACCINE >7 IM': ('imm_tdap',),
+    'TDAP VACCINE >7 IM': ('imm_tdap',),
+    'TD (VFC) VACCINE NO PRSRV >/= 7 IM': ('imm_tdap',),
+    'TD VACCINE NO PRSRV >/= 7 IM': ('imm_tdap',),
+}
+
+# - Descriptions that are not vaccines and are not stored in REDCap
+IGNORED_DESCRIPTIONS = {
+    'Immunizations Delinquent',
+    'Immunizations Reviewed And Current',
+    'Immunization Record Unavailable',
+}
+
+
+def build_immunizations(patients, descriptions, registry=VACCINE_REGISTRY, ignored=IGNORED_DESCRIPTIONS):
+    """
+    Count the Immunizations rows into REDCap vaccine fields, straight from (patient, description)
+    pairs -- no Description pivot is built (see indicators.count_pairs).
+
+    :param patients: Series of Patient #
+    :param descriptions: Series of stripped Descriptions aligned with ``patients``
+    :param registry: dict of {description: (REDCap field, ...)}
+    :param ignored: descriptions to drop silently
+    :returns: (DF_IMMUN indexed by Patient # with one int column of doses per field that
+               received a description, DataFrame of unknown descriptions with the patients and
+               doses recorded for each)
+    """
+    immun, unknown = count_pairs(patients, descriptions, registry, ignored)
+    return immun, unknown.rename(columns={'label': 'Description', 'keys': 'patients', 'rows': 'doses'})
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Patient x field count matrices built straight from (patient, label) pairs -- the
+            Orders screening flags and the immunization dose counts.
+
+  :notes:   Pivoting the Order/Immunization Description columns makes one dense column per
+            distinct description, and the table widens with every new order or vaccine
+            spelling, only for most columns to be dropped or folded into a handful of REDCap
+            fields afterwards. Here patients and labels are factorized, each distinct label is
+            looked up in the mapping once, and the rows are counted into the mapped fields with
+            one bincount per field; only the fields that received a label are ever allocated.
+            Labels missing from the mapping are counted for review instead of becoming columns.
+"""
+import numpy as np
+import pandas as pd
+
+
+def _targets(target):
+    if target is None:
+        return ()
+    return (target,) if isinstance(target, str) else tuple(target)
+
+
+def count_pairs(keys, labels, mapping, ignored=()):
+    """
+    Count (key, label) rows into the fields each label maps to.
+
+    :param keys: Series of row keys, e.g. Patient #
+    :param labels: Series of labels aligned with ``keys``, e.g. Order Description
+    :param mapping: dict of {label: field, tuple of fields, or None for a known label that is
+                    not counted}
+    :param ignored: further labels to skip silently
+    :returns: (DataFrame indexed by the sorted distinct keys that have a label, one int64 column
+               of row counts per field that received any -- fields in sorted order --;
+               DataFrame of the labels missing from ``mapping`` with the number of distinct
+               keys and of rows carrying each, in label order)
+    """
+    present = (keys.notna() & labels.notna()).to_numpy()
+    key_codes, key_values = pd.factorize(keys[present], sort=True)
+    label_codes, label_values = pd.factorize(labels[present], sort=True)
+    label_values = np.asarray(label_values, dtype=object)
+
+    fields = sorted({field for target in mapping.values() for field in _targets(target)})
+    position = dict((field, i) for i, field in enumerate(fields))
+    weights = np.zeros((len(label_values), len(fields)), dtype=np.int64)
+    known = np.ones(len(label_values), dtype=bool)
+    for i, label in enumerate(label_values):
+        if label in mapping:
+            weights[i, [position[field] for field in _targets(mapping[label])]] = 1
+        elif label not in ignored:
+            known[i] = False
+
+    used = np.flatnonzero(weights.any(axis=0))      # every label occurs, so these fields received rows
+    counts = np.empty((len(key_values), len(used)), dtype=np.int64)
+    for j, field in enumerate(used):
+        counts[:, j] = np.bincount(key_codes, weights=weights[label_codes, field], minlength=len(key_values))
+    frame = pd.DataFrame(counts, index=pd.Index(key_values, name=keys.name),
+                         columns=[fields[field] for field in used])
+
+    unknown = np.flatnonzero(~known)
+    rows = np.bincount(label_codes, minlength=len(label_values))
+    pairs = np.unique(key_codes.astype(np.int64) * len(label_values) + label_codes)
+    distinct_keys = np.bincount(pairs % max(len(label_values), 1), minlength=len(label_values))
+    report = pd.DataFrame({'label': label_values[unknown], 'keys': distinct_keys[unknown], 'rows': rows[unknown]})
+    return frame, report
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Normalizer for the free-text urinalysis results (lab_ua_blood, lab_ua_glucose,
+            lab_ua_protein) -- raw strings to negative / trace / positive / not performed.
+
+  :notes:   Bluegrass types these results by hand, so every month brings a new spelling
+            ('negatve', 'eneg', 'traace', 'tace-lysed'). Each distinct raw string is resolved
+            once: case-folded and matched against CANONICAL_TERMS, then, failing that, against
+            the nearest term within a small edit distance. Strings carrying a quantity
+            ('100', '5.5 mg/dl', '25 RBC/uL') count as positive unless the quantity is 0.
+
+            Resolutions are remembered, so a string is only ever resolved once across runs.
+            bchc/lab_aliases.json ships with the package and is only read (SEED_STORE); what a
+            run learns is added to a store of its own (ALIAS_STORE: ~/.bchc/lab_aliases.json,
+            or $BCHC_LAB_ALIASES), which is locked and read back just before it is written so
+            that runs in parallel (batch, watch) keep each other's entries. A store that cannot be written
+            is warned about, not fatal. Strings whose best match is too far off are not guessed;
+            they are left as they are and listed for review. To settle one, add it to either
+            store with "source": "manual" -- manual entries always win.
+"""
+import json
+import os
+import re
+import time
+import warnings
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+SEED_STORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lab_aliases.json')
+ALIAS_STORE = os.environ.get('BCHC_LAB_ALIASES') or os.path.join(os.path.expanduser('~'), '.bchc', 'lab_aliases.json')
+LOCK_SECONDS = 10       # a lock older than this was left by a process that died while saving
+
+# - Correctly spelled result terms and their category
+CANONICAL_TERMS = {
+    'negative': 'negative',
+    'neg': 'negative',
+    'none': 'none',
+    'trace': 'trace',
+    'trace-lysed': 'trace',
+    'trace-intact': 'trace',
+    'small': 'positive',
+    'moderate': 'positive',
+    'large': 'positive',
+    'positive': 'positive',
+    'pos': 'positive',
+    'not performed': 'not performed',
+}
+
+# - REDCap code of each category, per field ('None' means no blood, but an unrecorded glucose/protein)
+_UA_CODES = {'negative': 0, 'trace': 1, 'positive': 1, 'not performed': None}
+UA_RESULT_CODES = {
+    'lab_ua_blood': dict(_UA_CODES, none=0),
+    'lab_ua_glucose': dict(_UA_CODES, none=None),
+    'lab_ua_protein': dict(_UA_CODES, none=None),
+}
+
+_QUANTITY = re.compile(r'^\D*?(\d+(\.\d+)?)')
+_SEPARATORS = re.compile(r'\s*-\s*|\s+')
+
+
+def fold(value):
+    """Case-fold a raw result and collapse whitespace ('Trace - Lysed ' -> 'trace-lysed')."""
+    value = str(value).strip().lower()
+    return _SEPARATORS.sub(lambda match: '-' if '-' in match.group() else ' ', value)
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance of ``a`` and ``b``, or ``limit + 1`` as soon as it must exceed ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        current = [i]
+        for j, other in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def resolve(term, max_distance=2, threshold=0.75):
+    """
+    Resolve one folded result string.
+
+    :param term: output of fold()
+    :param max_distance: largest edit distance still accepted as a typo
+    :param threshold: minimum confidence, 1 - distance / length of the longer string
+    :returns: (category or None, confidence, source) where source is 'exact', 'quantity',
+              'fuzzy', or 'review' when the best guess was not accepted (category is then the
+              best guess, for the review list)
+    """
+    if term in CANONICAL_TERMS:
+        return CANONICAL_TERMS[term], 1.0, 'exact'
+    quantity = _QUANTITY.match(term)
+    if quantity:
+        return ('negative' if float(quantity.group(1)) == 0 else 'positive'), 1.0, 'quantity'
+
+    scored = sorted((edit_distance(term, known, max_distance), known) for known in CANONICAL_TERMS)
+    distance, best = scored[0]
+    if distance > max_distance:
+        return None, 0.0, 'review'
+    confidence = round(1 - float(distance) / max(len(term), len(best)), 3)
+    rivals = set(CANONICAL_TERMS[known] for d, known in scored if d == distance)
+    if confidence < threshold or len(rivals) > 1:
+        return CANONICAL_TERMS[best], confidence, 'review'
+    return CANONICAL_TERMS[best], confidence, 'fuzzy'
+
+
+def _read_store(path):
+    """The store at ``path``; empty when it does not exist.
+
+    :raises ValueError: when the file is not a JSON object (e.g. a typo in a hand edit)"""
+    try:
+        with open(path, encoding='utf-8') as handle:
+            store = json.load(handle)
+    except (IOError, OSError):
+        return {}
+    if not isinstance(store, dict):
+        raise ValueError('not a JSON object')
+    return store
+
+
+def _load_store(path):
+    try:
+        return _read_store(path)
+    except ValueError as error:
+        warnings.warn('lab alias store %s ignored, it cannot be read: %s' % (path, error))
+        return {}
+
+
+def load_alias_store(path=ALIAS_STORE, seed=SEED_STORE):
+    """
+    {folded string: {'category', 'confidence', 'source'}} -- the seed store with the learned
+    store at ``path`` added; a learned entry replaces a seed entry only when it is manual.
+    Stores that do not exist are empty; one that cannot be read is ignored, with a warning.
+    """
+    store = _load_store(seed) if seed else {}
+    for term, entry in _load_store(path).items():
+        if term not in store or entry.get('source') == 'manual':
+            store[term] = entry
+    return store
+
+
+@contextmanager
+def _locked(path, timeout=LOCK_SECONDS):
+    """Hold ``path``.lock while the store is read and rewritten; raises OSError after ``timeout``."""
+    lock = path + '.lock'
+    deadline = time.time() + timeout
+    while True:
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(lock).st_mtime > timeout:
+                    os.remove(lock)     # stale
+                    continue
+            except OSError:
+                continue
+            if time.time() > deadline:
+                raise OSError('%s is held by another process' % lock)
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.remove(lock)
+
+
+def save_alias_store(entries, path=ALIAS_STORE):
+    """
+    Add ``entries`` to the store at ``path``. The store is locked and read again first, so
+    entries other processes saved meanwhile are kept (and win over ``entries``). Written
+    atomically and sorted, so that its diffs stay readable.
+
+    :returns: True, or False -- with a warning -- when the store could not be written, or could
+              not be read (it is then left as it is rather than replaced, keeping hand edits)
+    """
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with _locked(path):
+            store = _read_store(path)
+            for term, entry in entries.items():
+                store.setdefault(term, entry)
+            tmp = '%s.%d.tmp' % (path, os.getpid())
+            with open(tmp, 'w', encoding='utf-8') as handle:
+                json.dump(store, handle, indent=1, sort_keys=True)
+                handle.write('\n')
+            os.replace(tmp, path)
+    except (IOError, OSError, ValueError) as error:
+        warnings.warn('lab aliases not saved to %s: %s' % (path, error))
+        return False
+    return True
+
+
+def normalize_results(frame, fields=None, store=None, path=ALIAS_STORE, max_distance=2, threshold=0.75):
+    """
+    Encode the free-text result columns of ``frame`` with one lookup per distinct string.
+
+    :param frame: DF_ORD2-like frame holding the result columns
+    :param fields: dict of {field: {category: REDCap code}}; defaults to UA_RESULT_CODES
+    :param store: alias store to use (and add new resolutions to); when None, the seed and the
+                  learned store at ``path`` are loaded and new resolutions are saved to ``path``
+    :returns: (copy of frame with the fields encoded -- unresolved strings are kept as they
+               are --, review DataFrame with columns field, value, guess, confidence, count)
+    """
+    fields = UA_RESULT_CODES if fields is None else fields
+    persist = store is None
+    store = load_alias_store(path) if persist else store
+    learned = {}
+
+    frame = frame.copy()
+    review = []
+    for field, codes in fields.items():
+        if field not in frame:
+            continue
+        values = frame[field]
+        codes_of, uniques = pd.factorize(values)
+        counts = np.bincount(codes_of[codes_of >= 0], minlength=len(uniques))
+        encoded = []
+        for raw, count in zip(uniques, counts):
+            term = fold(raw)
+            entry = store.get(term)
+            if entry is None:
+                category, confidence, source = resolve(term, max_distance, threshold)
+                entry = {'category': category, 'confidence': confidence, 'source': source}
+                if source != 'review':
+                    store[term] = learned[term] = entry
+            if entry.get('source') == 'review' or entry.get('category') not in codes:
+                encoded.append(raw)
+                review.append({'field': field, 'value': raw, 'guess': entry.get('category'),
+                               'confidence': entry.get('confidence'),
+                               'count': int(count)})
+            else:
+                encoded.append(codes[entry['category']])
+        lookup = np.array(encoded + [np.nan], dtype=object)     # code -1 (missing) -> NaN
+        frame[field] = pd.Series(lookup[codes_of], index=values.index, dtype=object)
+
+    if persist and learned:
+        save_alias_store(learned, path)
+    return frame, pd.DataFrame(review, columns=['field', 'value', 'guess', 'confidence', 'count'])
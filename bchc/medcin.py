@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Medcin answers -- one per patient and question -- from the long Medcin tab.
+
+  :notes:   The tab has a row per (patient, Medcin Description) answer, and the same answer is
+            often repeated (once per encounter or note). Pivoting with aggfunc='sum' glued the
+            repeats together ('YY') and mixed answers into codes nobody asked for ('NY').
+            Here patient, description and answer are factorized, each distinct (patient,
+            description, answer) is kept once, and a question that still has more than one
+            answer for a patient is a conflict, settled by an explicit rule:
+
+                'blank'  upload nothing and let the clinic resolve it (default)
+                'first'  the answer on the earliest row of the tab
+                'last'   the answer on the latest row
+
+            Every conflict is listed, whatever the rule, with the answers in the order they
+            appear. Answers are compared after stripping whitespace; blank answers are ignored.
+"""
+import numpy as np
+import pandas as pd
+
+CONFLICT_RULES = ('blank', 'first', 'last')
+
+
+def _answers(values):
+    """Factorize stripped answers; blank and missing answers get code -1."""
+    codes, uniques = pd.factorize(values)
+    stripped = pd.Series(np.asarray(uniques, dtype=object)).map(lambda value: value.strip()
+                                                                if isinstance(value, str) else value)
+    merged, answers = pd.factorize(stripped.mask(stripped == ''))
+    return np.append(merged, -1)[codes], np.asarray(answers, dtype=object)
+
+
+def pivot_answers(patients, descriptions, answers, conflict='blank'):
+    """
+    Spread (patient, description, answer) rows into one column per description.
+
+    :param patients: Series of Patient #
+    :param descriptions: Series of Medcin Description, aligned with ``patients``
+    :param answers: Series of Result, aligned with ``patients``
+    :param conflict: rule for a question with different answers, see CONFLICT_RULES
+    :returns: (DataFrame indexed by the sorted Patient # with an answer, one column per
+               description in sorted order, NaN where unanswered or blanked;
+               conflict report with Patient #, Medcin Description, answers ('N, Y') and the
+               answer kept)
+    """
+    if conflict not in CONFLICT_RULES:
+        raise ValueError('conflict must be one of %s, not %r' % (', '.join(CONFLICT_RULES), conflict))
+
+    answer_codes, answer_values = _answers(answers)
+    present = (patients.notna() & descriptions.notna()).to_numpy() & (answer_codes >= 0)
+    patient_codes, patient_values = pd.factorize(patients[present], sort=True)
+    question_codes, question_values = pd.factorize(descriptions[present], sort=True)
+    answer_codes = answer_codes[present]
+
+    cells = patient_codes.astype(np.int64) * len(question_values) + question_codes
+    # - the answer on the earliest (latest) row of each cell...
+    keep = ~pd.Series(cells).duplicated(keep='last' if conflict == 'last' else 'first').to_numpy()
+    grid = np.full(len(patient_values) * len(question_values), -1, dtype=np.int64)
+    grid[cells[keep]] = answer_codes[keep]
+
+    # - ...and one row per distinct (patient, question, answer), in the order of the tab
+    distinct = ~pd.Series(cells * max(len(answer_values), 1) + answer_codes).duplicated().to_numpy()
+    cells, answer_codes = cells[distinct], answer_codes[distinct]
+    counts = np.bincount(cells, minlength=len(grid))
+    conflicted = counts[cells] > 1
+    if conflict == 'blank':
+        grid[cells[conflicted]] = -1
+    lookup = np.append(answer_values, np.nan)       # code -1 picks NaN
+    wide = pd.DataFrame(lookup[grid].reshape(len(patient_values), len(question_values)),
+                        index=pd.Index(patient_values, name=patients.name),
+                        columns=pd.Index(question_values, name=descriptions.name))
+
+    rows = pd.DataFrame({'cell': cells[conflicted], 'answer': answer_values[answer_codes[conflicted]]})
+    report = rows.groupby('cell', sort=True)['answer'].agg(
+        lambda values: ', '.join(str(value) for value in values)).reset_index()
+    report_cells = report['cell'].to_numpy()
+    kept = lookup[grid[report_cells]]
+    report = pd.DataFrame({
+        patients.name: patient_values[report_cells // max(len(question_values), 1)],
+        descriptions.name: question_values[report_cells % max(len(question_values), 1)],
+        'answers': report['answer'].to_numpy(),
+        'kept': kept,
+    })
+    return wide, report
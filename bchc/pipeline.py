@@ -0,0 +1,534 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: The upload pipeline as functions -- one stage per ARHCA tab, plus assembly --
+            behind process_workbook(path) -> RESULT.
+
+  :notes:   Each stage takes the parsed sheet and returns new frames (sheets are never modified
+            in place, so cached sheets can be processed again). Everything the script used to
+            leave around for review -- unmapped codes, exclude-list hits, A# problems,
+            unresolved lab strings, unknown vaccines, assembly sizes -- is collected in the
+            optional `report` dict.
+
+            Importing this module loads pandas and the stage modules once; a long-running
+            process can call process_workbook() repeatedly without paying that again.
+
+            With stream=True, the Orders tab -- by far the largest, and mostly thrown away --
+            is read in chunks and filtered as it is read (stream_orders()), so memory follows
+            the rows that are kept rather than the size of the tab.
+
+            Pass a trace.Tracer to record the time, memory growth and rows in/out of every step
+            (load, filter, pivot, encode, join, range check).
+
+            The stages form a graph (pipeline_graph(), bchc/stages.py) whose outputs
+            process_workbook() memoizes in the cache: after fixing a vaccine name or an exclude
+            list, a rerun parses and recomputes only the tabs and stages downstream of the fix.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import bchc.alien
+import bchc.assemble
+import bchc.dtypes
+import bchc.immun
+import bchc.indicators
+import bchc.labs
+import bchc.medcin
+import bchc.ranges
+import bchc.vitals
+from bchc.alien import find_alien_conflicts, normalize_alien_numbers
+from bchc.assemble import assemble
+from bchc.cache import default_cache_dir, file_digest
+from bchc.codes import DEMOGRAPHIC_CODES, MEDCIN_CODES, ORDER_CODES, encode_choices, encode_column
+from bchc.dtypes import LAB_FIELDS, compact_result
+from bchc.filters import (IMMUN_EXCLUDE, MEDCIN_DEMOGRAPHICS, MEDCIN_EXCLUDE, ORDER_EXCLUDE,
+                          RESULT_COMPONENT_EXCLUDE, compile_excludes, exclude_mask, exclude_rows)
+from bchc.immun import IGNORED_DESCRIPTIONS, VACCINE_REGISTRY, build_immunizations
+from bchc.indicators import count_pairs
+from bchc.labs import CANONICAL_TERMS, UA_RESULT_CODES, load_alias_store, normalize_results
+from bchc.medcin import pivot_answers
+from bchc.ranges import LAB_RANGES, check_ranges, coerce_numbers
+from bchc.sheets import SHEETS, detect_sheets, load_sheets, stream_sheet
+from bchc.stages import Stage, StageGraph
+from bchc.trace import NULL_TRACER
+from bchc.vitals import clean_vitals
+
+# - Bluegrass column names -> REDCap field names
+DEMOGRAPHIC_COLUMNS = {
+    'Patient Name': 'name', 'Date of Birth': 'date_of_birth', 'Gender': 'gender',
+    'Marriage Status': 'marriage_status', 'Insurance': 'health_insurance',
+    'Resettlement Agency': 'resettlement_agency', 'Zip Code': 'zip_code',
+}
+MEDCIN_DEMOGRAPHIC_COLUMNS = {
+    'Country of Departure': 'cntry_dept', 'Country of Origin': 'cntry_origin',
+    'Date of U.S. Arrival': 'us_arrival_date',
+}
+MEDCIN_COLUMNS = {
+    'Betel Nut use': 'nw_betel_nut',
+    'Blood Transfusion (___ ml)': 'nw_bld_tx',
+    'Class B TB Status': 'ovs_class_btb',
+    'Currently breastfeeding': 'nw_breastfeeding',
+    'Overseas medical records indicate a diagnosis of mental illness': 'ovs_mntl_hlth',
+    'Patient has experienced imprisonment - torture or violence.  Effect on patient:': 'seh_exprcd_torture_yn',
+    'Patient has witnessed someone experiencing torture or violence.': 'seh_wtnss_torture_yn',
+    'Pre-departure treatment for Malaria': 'ovs_malaria',
+    'Pre-departure treatment given for intestinal parasites': 'ovs_intstnl_parasites',
+    'Regular medications - vitamins - herbs or traditional medications used.': 'seh_rglr_meds_vit_yn',
+    'Secondary Migrant': 'secondary_migrant',
+    'Street drugs': 'nw_strt_drugs_yn',
+    'Tattoo': 'nw_tattoo',
+    'There is a faith tradition / religion that the patient practices.': 'seh_faith_yn',
+    'Use of injection drugs ever': 'nw_injctd_drgs',
+    'alcohol use': 'nw_ethoh_yn',
+    'chewing nicotine-containing substances': 'nw_chews_yn',
+    'current smoker': 'nw_smokes_yn',
+    'patient thinks she may be pregnant': 'nw_pregnant',
+    'sexually active': 'nw_sexually_act',
+}
+# - Orders: the columns used, screening flags (Order Description) and results (Result Component)
+ORDER_COLUMNS = ['Patient #', 'Order Description', 'Result Component', 'Result']
+ORDER_SCREEN_FIELDS = {    # Order Description -> 'was it ordered?' flag; None: known order, no flag
+    'CBC': 'lab_cbc_scrnd',
+    'CMP': 'alr_cmp_scrnd',
+    'Ova and Parasites, Stool Conc/Perm Smear, 2 spec': 'ips_scrnd',
+    'OVA AND PARASITES, STOOL CONC/PERM SMEAR, 2 SPEC': 'ips_scrnd',
+    'TB AG RESPONSE T-CELL SUSP': 'lab_tb_test_type',
+    'URINALYSIS, AUTO, W/O SCOPE': 'lab_ua_scrnd',
+    'VISUAL ACUITY SCREEN': 'vsd1_vsn_scrnd',
+    # - any of these counts as a hepatitis B screen
+    'HEPATITIS B SURFACE ANTIGEN (HBsAG)': 'lab_hepb_scrn',
+    'HEPATITIS B SURFACE ANTIGEN (HBSAG)': 'lab_hepb_scrn',
+    'HEP B SURFACE ANTIBODY': 'lab_hepb_scrn',
+    'HEPATITIS B CORE AB TOTAL': 'lab_hepb_scrn',
+    'COMPREHENSIVE METABOLIC PANEL W/O EGFR': None,
+    'LIPID PANEL': None,
+    'SYPHILIS TEST, NON-TREP, QUALITATIVE': None,
+    'URINE PREGNANCY TEST': None,
+}
+ORDER_RESULT_COLUMNS = {
+    'ALBUMIN': 'alr_cmp_albumin', 'ALT': 'alr_cmp_alt', 'AST': 'alr_cmp_ast',
+    'Blood': 'lab_ua_blood', 'BILIRUBIN, TOTAL': 'alr_cmp_bilirubin', 'CALCIUM': 'alr_cmp_ca',
+    'Both Eyes': 'vsd1_vision_both', 'CHLORIDE': 'alr_cmp_cl', 'CHOLESTEROL, TOTAL': 'lab_cholesterol_rslt',
+    'CREATININE': 'alr_cmp_creatinine', 'GLUCOSE': 'alr_cmp_glucose', 'Glucose': 'lab_ua_glucose',
+    'HDL CHOLESTEROL': 'lab_hdl_rslt', 'HEMATOCRIT': 'lab_hematocrit', 'HEMOGLOBIN': 'lab_hemoglobin',
+    'HEPATITIS B CORE AB TOTAL': 'lab_hbcab', 'HEPATITIS B SURFACE ANTIBODY QL': 'lab_hbsab',
+    'HEPATITIS B SURFACE$ANTIGEN': 'lab_hbsag', 'LDL-CHOLESTEROL': 'alr_cmp_ldl', 'Left Eye': 'vsd1_vision_left',
+    'MCV': 'lab_mcv', 'RDW': 'lab_rdw', 'PLATELET COUNT': 'lab_platelet', 'POTASSIUM': 'alr_cmp_k',
+    'RHS 15 Score': 'rhs15_score', 'PROTEIN, TOTAL': 'alr_cmp_ttlprotein', 'Protein': 'lab_ua_protein',
+    'Right Eye': 'vsd1_vision_right', 'SODIUM': 'alr_cmp_na', 'TRIGLYCERIDES': 'alr_cmp_tryglycde',
+    'URINE PREGNANCY TEST': 'lab_pregnant_rslt', 'WHITE BLOOD CELL COUNT': 'lab_wbc',
+    'RPR (DX) W/REFL TITER AND CONFIRMATORY TESTING': 'lab_syphilis_rslts',
+}
+
+
+def user_fields_stage(user_fields, tracer=NULL_TRACER):
+    """
+    A# of every patient from the User Defined Fields tab.
+
+    :returns: (frame with Patient # and alien_no -- NaN where the A# is invalid --,
+               invalid A# frame, A# conflicts -- see alien.find_alien_conflicts)
+    """
+    with tracer.span('filter', user_fields) as span:
+        frame = user_fields[user_fields['Patient #'].notna()]
+        span.output(frame)
+    with tracer.span('encode', frame) as span:
+        alien_no, problem = normalize_alien_numbers(frame['Value'])
+        invalid = pd.DataFrame({'Patient #': frame['Patient #'], 'Value': frame['Value'],
+                                'alien_no_problem': problem})[problem != '']
+        frame = frame.drop(columns=['Value', 'Field Name']).assign(alien_no=alien_no)
+        span.output(frame)
+        span.set(alien_invalid=len(invalid))
+    with tracer.span('conflicts', frame) as span:
+        conflicts = find_alien_conflicts(frame)
+        span.output(conflicts)
+    return frame, invalid, conflicts
+
+
+def demographics_stage(patients, demographics, tracer=NULL_TRACER):
+    """
+    Join the Patient Demo tab onto the A#s; one row per A#, indexed by Patient #.
+
+    :returns: (coded demographics frame, {field: [unmapped values]})
+    """
+    with tracer.span('join', patients) as span:
+        demographics = demographics.rename(columns=DEMOGRAPHIC_COLUMNS).drop(columns=['Age'])   # Age is autocalculated
+        demographics['zip_code'] = demographics.zip_code.astype(str).str[:5].where(demographics.zip_code.notna())
+        result = patients.join(demographics.set_index('Patient #'), on='Patient #').set_index('Patient #')
+        span.output(result)
+    with tracer.span('filter', result) as span:     # patients without a valid A#, repeated A#s
+        result = result[result.alien_no.notna()].drop_duplicates('alien_no')
+        span.output(result)
+    with tracer.span('encode', result) as span:
+        result, unmapped = encode_choices(result, DEMOGRAPHIC_CODES)
+        span.output(result)
+    return result, unmapped
+
+
+def vitals_stage(vitals, tracer=NULL_TRACER, encounter='first'):
+    """
+    Vitals of the earliest (or latest) encounter per patient: height/weight in cm/kg, blood
+    pressure split (see vitals.clean_vitals; BMI is autocalculated in REDCap).
+
+    :returns: (vitals frame, bad-value report)
+    """
+    with tracer.span('pivot', vitals) as span:
+        vitals, bad = clean_vitals(vitals, encounter)
+        span.output(vitals)
+        span.set(vitals_bad=len(bad))
+    return vitals, bad
+
+
+def medcin_stage(medcin, tracer=NULL_TRACER, conflict='blank'):
+    """
+    The Medcin tab: demographic answers misplaced there, and the coded Medcin fields.
+
+    :param conflict: rule for a question answered differently, see medcin.CONFLICT_RULES
+    :returns: (list of (name, frame) demographic frames -- country, arrival and, when present,
+               preferred language --, coded Medcin frame, {field: [unmapped values]},
+               {exclude list: hits}, conflict report)
+    """
+    hits = {}
+    with tracer.span('filter', medcin) as span:
+        medcin = medcin.drop(columns=['Enc Date', 'Medcin Id', 'Value', 'Onset Date'])
+        medcin, hits['medcin'] = exclude_rows(medcin, 'Medcin Description', MEDCIN_EXCLUDE)
+        span.output(medcin)
+    description = medcin['Medcin Description']
+    # - the questions are few and the rows many, so each distinct description is matched once
+    codes, questions = pd.factorize(description)
+
+    def asks(predicate):
+        return np.append([predicate(question) for question in questions], False).astype(bool)[codes]
+
+    def notes(rows):
+        return pivot_answers(rows['Patient #'], rows['Medcin Description'], rows['Note'],
+                             'first')[0].rename(columns=MEDCIN_DEMOGRAPHIC_COLUMNS)
+
+    with tracer.span('demographics', medcin) as span:
+        demographics = [('medcin_country', notes(medcin[asks(lambda question: 'Country' in str(question))])),
+                        ('medcin_arrival', notes(medcin[asks(lambda question: 'Arrival' in str(question))]))]
+        # - "preferred language" appears in some workbooks only
+        if 'preferred language' in set(questions):
+            language = notes(medcin[asks(lambda question: question == 'preferred language')])['preferred language']
+            demographics.append(('medcin_language',
+                                 (language == 'Spanish').astype(int).to_frame('preferred_language')))
+            demographics.append(('medcin_language_other', language.to_frame('prefered_language_other')))
+        span.output([frame for _, frame in demographics])
+
+    with tracer.span('filter_demographics', medcin) as span:
+        medcin = medcin.drop(columns=['Note'])
+        medcin, hits['medcin_demographics'] = exclude_rows(medcin, 'Medcin Description', MEDCIN_DEMOGRAPHICS)
+        span.output(medcin)
+    with tracer.span('pivot', medcin) as span:
+        medcin, conflicts = pivot_answers(medcin['Patient #'], medcin['Medcin Description'], medcin['Result'],
+                                          conflict)
+        medcin = medcin.rename(columns=MEDCIN_COLUMNS)
+        span.output(medcin)
+        span.set(conflicts=len(conflicts))
+    with tracer.span('encode', medcin) as span:
+        medcin, unmapped = encode_choices(medcin, MEDCIN_CODES)
+        span.output(medcin)
+    return demographics, medcin, unmapped, hits, conflicts
+
+
+def filter_orders(orders):
+    """
+    Keep the Orders rows and columns the upload uses.
+
+    Rows of excluded orders are dropped. A row of an excluded result component still shows
+    that the order was placed, so only its component and result are blanked, and the repeated
+    (patient, order) rows this leaves are dropped.
+
+    :returns: (frame with ORDER_COLUMNS, {exclude list: hits})
+    """
+    hits = {}
+    orders = orders[ORDER_COLUMNS]
+    orders, hits['order_description'] = exclude_rows(orders, 'Order Description', ORDER_EXCLUDE)
+    excluded, hits['result_component'] = exclude_mask(orders['Result Component'], RESULT_COMPONENT_EXCLUDE)
+    orders = orders.assign(**{'Result Component': orders['Result Component'].mask(excluded),
+                              'Result': orders['Result'].mask(excluded)})
+    return orders.drop_duplicates(), hits
+
+
+def stream_orders(path, sheet=SHEETS['orders'], chunk_size=50000):
+    """
+    Read the Orders tab in chunks of ``chunk_size`` rows, filtering each (see filter_orders)
+    before the next is read.
+
+    :returns: (filtered Orders frame, {exclude list: hits}) -- pass both to orders_stage
+    """
+    parts, hits = [], {}
+    for chunk in stream_sheet(path, sheet, ORDER_COLUMNS, chunk_size):
+        chunk, chunk_hits = filter_orders(chunk)
+        parts.append(chunk)
+        for name, counts in chunk_hits.items():
+            hits[name] = counts if name not in hits else hits[name] + counts
+    return pd.concat(parts, ignore_index=True).drop_duplicates(), hits
+
+
+def orders_stage(orders, lab_aliases=None, tracer=NULL_TRACER, filter_hits=None):
+    """
+    The Orders tab: screening flags (was the order placed?) and coded results.
+
+    :param lab_aliases: alias store for the urinalysis normalizer (see labs.normalize_results)
+    :param filter_hits: exclude-list hits of an Orders tab that stream_orders already filtered;
+                        None filters ``orders`` here
+    :returns: (orders frame, {field: [unmapped values]}, unresolved lab strings,
+               unknown orders -- Order Descriptions missing from ORDER_SCREEN_FIELDS, with the
+               patients and rows of each --, {exclude list: hits})
+    """
+    with tracer.span('filter', orders) as span:
+        if filter_hits is None:
+            orders, hits = filter_orders(orders)
+        else:
+            hits = dict(filter_hits)
+        span.output(orders)
+
+    # - Has patient been tested?   0 = No | 1 = Yes
+    with tracer.span('screens', orders) as span:
+        screens, unknown = count_pairs(orders['Patient #'], orders['Order Description'], ORDER_SCREEN_FIELDS)
+        screens = (screens > 0).astype(int)
+        unknown = unknown.rename(columns={'label': 'Order Description', 'keys': 'patients'})
+        span.output(screens)
+        span.set(order_unknown=len(unknown))
+
+    with tracer.span('result_filter', orders) as span:     # the rows filter_orders blanked
+        orders = orders[orders['Result Component'].notna()]
+        span.output(orders)
+    with tracer.span('result_pivot', orders) as span:
+        results = orders.pivot_table(index='Patient #', columns='Result Component', values='Result', aggfunc='first')
+        results = results.rename(columns=ORDER_RESULT_COLUMNS)
+        span.output(results)
+    with tracer.span('encode', results) as span:
+        results, lab_review = normalize_results(results, store=lab_aliases)
+        results, unmapped = encode_choices(results, ORDER_CODES)
+        if 'vsd1_vision_both' in results:
+            results['vsd1_vision_both'] = '20/' + results.vsd1_vision_right
+        span.output(results)
+        span.set(lab_review=len(lab_review))
+
+    with tracer.span('join', [screens, results]) as span:
+        combined = screens.join(results, how='outer').sort_index(axis=1)
+        span.output(combined)
+    return combined, unmapped, lab_review, unknown, hits
+
+
+def immunizations_stage(immunizations, tracer=NULL_TRACER):
+    """
+    The Immunizations tab as dose counts per REDCap vaccine field.
+
+    :returns: (immunization frame, unknown descriptions -- see immun.build_immunizations --,
+               {exclude list: hits})
+    """
+    hits = {}
+    with tracer.span('filter', immunizations) as span:
+        immunizations = immunizations.drop(columns=['Code', 'Date Ordered'])
+        immunizations, hits['immunizations'] = exclude_rows(immunizations, 'Description', IMMUN_EXCLUDE)
+        span.output(immunizations)
+    with tracer.span('count', immunizations) as span:
+        frame, unknown = build_immunizations(immunizations['Patient #'], immunizations.Description.str.strip())
+        span.output(frame)
+        span.set(immun_unknown=len(unknown))
+    return frame, unknown, hits
+
+
+def finish_result(result, lab_ranges=None, tracer=NULL_TRACER):
+    """
+    Lab results as numbers within their ranges, compact dtypes, and RESULT indexed by alien_no.
+
+    :param lab_ranges: dict of {field: (low, high)} (default: ranges.LAB_RANGES)
+    :returns: (RESULT; lab values that are not numbers; lab values blanked as out of range) --
+              both reports cover the records kept in RESULT only
+    """
+    lab_ranges = LAB_RANGES if lab_ranges is None else lab_ranges
+    with tracer.span('lab_numbers', result) as span:
+        result, not_numeric = coerce_numbers(result, LAB_FIELDS)
+        span.output(result)
+        span.set(not_numeric=len(not_numeric))
+    with tracer.span('encode', result) as span:
+        result = compact_result(result)
+        span.output(result)
+    with tracer.span('range_check', result) as span:
+        result, out_of_range = check_ranges(result, lab_ranges)
+        span.output(result)
+        span.set(values_blanked=len(out_of_range))
+    with tracer.span('filter', result) as span:     # rows whose A# was invalid
+        result = result[result['alien_no'].notna()].set_index('alien_no', drop=False)
+        for field in ('vsd1_height', 'vsd1_weight'):
+            if field in result:
+                result[field] = result[field].round(2)
+        span.output(result)
+    not_numeric = not_numeric[not_numeric['alien_no'].notna()].reset_index(drop=True)
+    out_of_range = out_of_range[out_of_range['alien_no'].notna()].reset_index(drop=True)
+    return result, not_numeric, out_of_range
+
+
+def assemble_stage(demographics, vitals, medcin, orders, immunizations, tracer=NULL_TRACER):
+    """
+    Join the outputs of the tab stages onto the demographics, one row per A#.
+
+    :returns: (assembled frame, assembly report -- see assemble.assemble)
+    """
+    frames = medcin[0] + [('vitals', vitals[0]), ('orders', orders[0]), ('medcin', medcin[1]),
+                          ('immunizations', immunizations[0])]
+    with tracer.span('concat', [demographics[0]] + [frame for _, frame in frames]) as span:
+        result, report = assemble(demographics[0], frames, base_name='demographics')
+        span.output(result)
+        span.set(result_bytes=report['result_bytes'])
+    return result, report
+
+
+def _orders_stage(orders, tracer=NULL_TRACER, lab_aliases=None):
+    # - a streamed Orders tab arrives as (filtered frame, exclude-list hits), see stream_orders
+    orders, filter_hits = orders if isinstance(orders, tuple) else (orders, None)
+    return orders_stage(orders, lab_aliases, tracer, filter_hits)
+
+
+def pipeline_graph(sources, lab_aliases=None, vitals_encounter='first', medcin_conflict='blank',
+                   fingerprints=None, memo_dir=None, tracer=NULL_TRACER):
+    """
+    The stages of process_sheets as a stages.StageGraph.
+
+    :param sources: dict of {sheet name: frame, or callable returning it}; a streamed Orders tab
+                    is (frame, exclude-list hits) as returned by stream_orders
+    :param lab_aliases: alias store for the urinalysis normalizer (default: the seed and learned
+                        stores, see bchc/labs.py); it is part of the Orders key, so Orders runs once
+                        more after a run has learned new spellings
+    :param fingerprints: dict of {sheet name: string identifying its contents}, see StageGraph
+    :param memo_dir: directory the stage outputs are memoized in; None memoizes nothing
+    :returns: StageGraph
+    """
+    aliases = load_alias_store() if lab_aliases is None else lab_aliases
+    encode = (encode_column, encode_choices)
+    excludes = (exclude_rows, exclude_mask, compile_excludes)
+    stages = [
+        Stage('user_fields', ['user_fields'], user_fields_stage, code=(user_fields_stage, bchc.alien)),
+        Stage('demographics', [('user_fields', 0), 'demographics'], demographics_stage,
+              code=(demographics_stage,) + encode, config=(DEMOGRAPHIC_COLUMNS, DEMOGRAPHIC_CODES)),
+        Stage('vitals', ['vitals'], vitals_stage, code=(vitals_stage, bchc.vitals), config=vitals_encounter,
+              options={'encounter': vitals_encounter}),
+        Stage('medcin', ['medcin'], medcin_stage, code=(medcin_stage, bchc.medcin) + encode + excludes,
+              config=(MEDCIN_EXCLUDE, MEDCIN_DEMOGRAPHICS, MEDCIN_DEMOGRAPHIC_COLUMNS, MEDCIN_COLUMNS, MEDCIN_CODES,
+                      medcin_conflict),
+              options={'conflict': medcin_conflict}),
+        Stage('orders', ['orders'], _orders_stage,
+              code=(_orders_stage, orders_stage, filter_orders, bchc.indicators, bchc.labs) + encode + excludes,
+              config=(ORDER_COLUMNS, ORDER_EXCLUDE, RESULT_COMPONENT_EXCLUDE, ORDER_SCREEN_FIELDS,
+                      ORDER_RESULT_COLUMNS, ORDER_CODES, CANONICAL_TERMS, UA_RESULT_CODES, aliases),
+              options={'lab_aliases': lab_aliases}),
+        Stage('immunizations', ['immunizations'], immunizations_stage,
+              code=(immunizations_stage, bchc.immun, bchc.indicators) + excludes,
+              config=(IMMUN_EXCLUDE, VACCINE_REGISTRY, IGNORED_DESCRIPTIONS)),
+        Stage('assemble', ['demographics', 'vitals', 'medcin', 'orders', 'immunizations'], assemble_stage,
+              code=(assemble_stage, bchc.assemble)),
+        Stage('finish', [('assemble', 0)], finish_result, code=(finish_result, bchc.dtypes, bchc.ranges),
+              config=(LAB_FIELDS, LAB_RANGES)),
+    ]
+    return StageGraph(stages, sources, fingerprints, memo_dir, tracer)
+
+
+def process_sheets(sheets, report=None, lab_aliases=None, tracer=NULL_TRACER, order_hits=None,
+                   vitals_encounter='first', medcin_conflict='blank', memo_dir=None, fingerprints=None):
+    """
+    Run every stage on already parsed sheets.
+
+    :param sheets: dict of {name: DataFrame} as returned by sheets.load_sheets; values may also
+                   be callables returning the frame, called only when a stage needs it
+    :param report: optional dict; filled with 'alien_invalid', 'alien_conflicts', 'unmapped',
+                   'filter_hits', 'vitals_bad', 'medcin_conflicts', 'lab_review', 'lab_not_numeric',
+                   'lab_out_of_range', 'order_unknown', 'immun_unknown', 'assembly' and 'stages'
+                   ({stage: 'ran' or 'reused'})
+    :param lab_aliases: alias store for the urinalysis normalizer (default: the seed and learned
+                        stores, see bchc/labs.py)
+    :param tracer: trace.Tracer recording every step
+    :param order_hits: exclude-list hits when sheets['orders'] was read with stream_orders
+    :param vitals_encounter: 'first' or 'last' -- which encounter's vitals are uploaded
+    :param medcin_conflict: 'blank', 'first' or 'last' -- the answer uploaded for a Medcin
+                            question answered differently (see medcin.CONFLICT_RULES)
+    :param memo_dir: memoize the stage outputs in this directory and reuse those whose inputs,
+                     code and options are unchanged (see bchc/stages.py); None runs every stage
+    :param fingerprints: dict of {sheet name: string identifying its contents}; sheets without
+                         one are hashed when memoizing
+    :returns: RESULT DataFrame, indexed by alien_no
+    """
+    report = {} if report is None else report
+    sources = dict(sheets)
+    if order_hits is not None:
+        sources['orders'] = (sources['orders'], order_hits)
+    graph = pipeline_graph(sources, lab_aliases, vitals_encounter, medcin_conflict, fingerprints, memo_dir, tracer)
+    outputs = graph.run()
+
+    report['alien_invalid'], report['alien_conflicts'] = outputs['user_fields'][1:]
+    report['vitals_bad'] = outputs['vitals'][1]
+    report['medcin_conflicts'] = outputs['medcin'][4]
+    report['lab_review'], report['order_unknown'] = outputs['orders'][2:4]
+    report['immun_unknown'] = outputs['immunizations'][1]
+    report['assembly'] = outputs['assemble'][1]
+    hits = {}
+    for stage_hits in (outputs['medcin'][3], outputs['orders'][4], outputs['immunizations'][2]):
+        hits.update(stage_hits)
+    report.update(unmapped={'demographics': outputs['demographics'][1], 'medcin': outputs['medcin'][2],
+                            'orders': outputs['orders'][1]},
+                  filter_hits=hits, stages=graph.status)
+    result, report['lab_not_numeric'], report['lab_out_of_range'] = outputs['finish']
+    return result
+
+
+def process_workbook(path, sheets=None, max_workers=None, use_cache=True, cache_dir=None,
+                     report=None, lab_aliases=None, tracer=NULL_TRACER, stream=False, chunk_size=50000,
+                     vitals_encounter='first', medcin_conflict='blank'):
+    """
+    Turn one ARHCA workbook into the REDCap RESULT frame.
+
+    :param path: .xls/.xlsx workbook
+    :param sheets: dict of {name: sheet index or name} for tabs to take from a given position;
+                   the others (see sheets.SHEETS) are found by their header row (sheets.detect_sheets)
+    :param max_workers: sheet parser processes (see sheets.load_sheets); 1 parses in-process
+    :param use_cache: use the parsed-sheet cache and memoize the stage outputs in it, so a rerun
+                      only parses the tabs and runs the stages a change affects (see bchc/stages.py)
+    :param cache_dir: cache location (default: .bchc_cache beside the workbook)
+    :param report: optional dict filled with the review tables, see process_sheets
+    :param tracer: trace.Tracer recording every step
+    :param stream: read the Orders tab in chunks of ``chunk_size`` rows, filtering as it is read
+                   (stream_orders); it is then not cached
+    :param vitals_encounter: 'first' or 'last' -- which encounter's vitals are uploaded
+    :param medcin_conflict: 'blank', 'first' or 'last', see process_sheets
+    :returns: RESULT DataFrame, indexed by alien_no
+    """
+    sheets = dict(sheets or {})
+    missing = [name for name in SHEETS if name not in sheets]
+    if missing:
+        with tracer.span('detect_sheets', workbook=os.path.basename(path)) as span:
+            sheets.update(detect_sheets(path, missing, use_cache=use_cache, cache_dir=cache_dir))
+            span.set(sheets=sheets)
+
+    memo_dir, fingerprints = None, None
+    if use_cache:
+        memo_dir = cache_dir or default_cache_dir(path)
+        digest = file_digest(path)
+        fingerprints = dict((name, '%s:%s%s' % (digest, sheet, ':stream' if stream and name == 'orders' else ''))
+                            for name, sheet in sheets.items())
+
+    def loader(name):
+        if stream and name == 'orders':
+            return lambda: stream_orders(path, sheets[name], chunk_size)
+        return lambda: load_sheets(path, {name: sheets[name]}, max_workers=1, use_cache=use_cache,
+                                   cache_dir=cache_dir)[name]
+
+    # - parse only the tabs feeding a stage that is not memoized; the others load if it turns out they are needed
+    sources = dict((name, loader(name)) for name in sheets)
+    graph = pipeline_graph(sources, lab_aliases, vitals_encounter, medcin_conflict, fingerprints, memo_dir)
+    needed = graph.needed_sources()
+    with tracer.span('load_sheets', workbook=os.path.basename(path)) as span:
+        parse = dict((name, sheets[name]) for name in needed if not (stream and name == 'orders'))
+        frames = load_sheets(path, parse, max_workers=max_workers, use_cache=use_cache, cache_dir=cache_dir)
+        span.output(frames)
+        span.set(sheets=sorted(frames))
+    sources.update(frames)
+    order_hits = None
+    if stream and 'orders' in needed:
+        with tracer.span('stream_orders', chunk_size=chunk_size) as span:
+            sources['orders'], order_hits = stream_orders(path, sheets['orders'], chunk_size)
+            span.output(sources['orders'])
+    return process_sheets(sources, report, lab_aliases, tracer, order_hits, vitals_encounter, medcin_conflict,
+                          memo_dir, fingerprints)
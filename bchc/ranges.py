@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Lab results as numbers, and the ranges REDCap accepts for them.
+
+  :notes:   The lab columns arrive from the Orders pivot as text -- '212', ' 41.5', '' and the
+            odd 'see comment' or '<5'. coerce_numbers() turns the whole lab block into float32
+            in one pass over its distinct values; text that is not a number becomes NA and is
+            listed, so it is no longer lost silently.
+
+            check_ranges() then tests every value of the block against LAB_RANGES at once. A
+            value at or beyond either bound is blanked -- REDCap rejects it on import -- and
+            listed with the bounds it failed. The bounds sit just outside the REDCap
+            validation range (platelets 100-450 -> 99.9, 450.1) and are compared in float32,
+            the dtype of the lab columns.
+"""
+import numpy as np
+import pandas as pd
+
+# - REDCap field -> (low, high); values <= low or >= high are blanked
+LAB_RANGES = {
+    'lab_platelet': (99.9, 450.1),
+    'lab_hematocrit': (24.9, 54.1),
+    'lab_hemoglobin': (9.9, 18.1),
+    'lab_cholesterol_rslt': (99.9, 300.1),
+    'lab_wbc': (2.9, 14.1),
+    'lab_mcv': (49.9, 100.1),
+    'lab_rdw': (10.9, 20.1),
+}
+
+
+def coerce_numbers(frame, fields, key='alien_no', dtype='float32'):
+    """
+    Convert ``fields`` of ``frame`` to numbers.
+
+    :param fields: columns to convert; those missing from ``frame`` are skipped
+    :param key: column identifying the record in the report
+    :returns: (copy of frame with the fields as ``dtype``; report of the values that are not
+               numbers, with key, field and value)
+    """
+    fields = [field for field in fields if field in frame]
+    block = frame[fields].to_numpy(dtype=object)
+    codes, uniques = pd.factorize(block.ravel())
+    text = pd.Series(np.asarray(uniques, dtype=object)).map(lambda value: value.strip()
+                                                             if isinstance(value, str) else value)
+    text = text.mask(text == '')
+    numbers = pd.to_numeric(text, errors='coerce').to_numpy(dtype='float64')
+    failed = np.append(text.notna().to_numpy() & np.isnan(numbers), False)[codes].reshape(block.shape)
+    numbers = np.append(numbers, np.nan)[codes].reshape(block.shape).astype(dtype)
+
+    rows, columns = np.nonzero(failed)
+    report = pd.DataFrame({key: frame[key].to_numpy()[rows], 'field': np.asarray(fields, dtype=object)[columns],
+                           'value': block[rows, columns]})
+    converted = frame.copy()
+    for i, field in enumerate(fields):
+        converted[field] = pd.Series(numbers[:, i], index=frame.index)
+    return converted, report
+
+
+def check_ranges(frame, ranges=LAB_RANGES, key='alien_no'):
+    """
+    Blank the values outside ``ranges``.
+
+    :param frame: frame whose range fields are float32 (see coerce_numbers)
+    :param ranges: dict of {field: (low, high)}; fields missing from ``frame`` are skipped
+    :param key: column identifying the record in the report
+    :returns: (copy of frame with the values at or beyond a bound blanked; report of the
+               blanked values with key, field, value, low and high)
+    """
+    fields = [field for field in ranges if field in frame]
+    block = frame[fields].to_numpy(dtype='float32', na_value=np.nan, copy=True)
+    low = np.array([ranges[field][0] for field in fields], dtype='float32')
+    high = np.array([ranges[field][1] for field in fields], dtype='float32')
+    outside = (block <= low) | (block >= high)
+
+    rows, columns = np.nonzero(outside)
+    bounds = np.array([ranges[field] for field in fields], dtype='float64').reshape(-1, 2)
+    report = pd.DataFrame({key: frame[key].to_numpy()[rows], 'field': np.asarray(fields, dtype=object)[columns],
+                           'value': block[rows, columns].astype(str).astype('float64'),     # 18.2, not 18.200001
+                           'low': bounds[columns, 0], 'high': bounds[columns, 1]})
+    block[outside] = np.nan
+    checked = frame.copy()
+    for i, field in enumerate(fields):
+        checked[field] = pd.Series(block[:, i], index=frame.index)
+    return checked, report
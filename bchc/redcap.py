@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: REDCap API client -- chunked, concurrent record import over a pooled session.
+
+  :notes:   RESULT is sent as flat CSV records (the same format the Data Import Tool takes),
+            in chunks of `chunk_size` rows. Chunks go out over one keep-alive session from a
+            small thread pool; a chunk that fails with a connection error, timeout, 429 or 5xx
+            is retried with exponential backoff, while a 4xx (bad field, bad code) is reported
+            straight away since resending it cannot succeed.
+
+            delta_upload() first exports the stored values of the affected records, diffs them
+            against RESULT and only sends the records and cells that changed. With the default
+            overwriteBehavior 'normal', blank cells are never written, so values that were
+            cleared since the last upload are only counted in the summary, not blanked in REDCap.
+
+            Requires the `requests` package. Try it against a local stand-in server first:
+                python -m bchc.standin --port 8080
+"""
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+API_URL = 'https://refugeehealth.louisville.edu/api/'
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class RedcapError(Exception):
+    """REDCap rejected a request; the message is REDCap's own error text."""
+
+    def __init__(self, message, status=None):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+def make_session(pool_size=4):
+    """A requests session whose connection pool keeps ``pool_size`` connections alive."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def post(session, url, data, timeout=120):
+    """POST one API request and return the response body, raising RedcapError on rejection."""
+    response = session.post(url, data=data, timeout=timeout)
+    if response.status_code != 200:
+        try:
+            message = response.json()['error']
+        except (ValueError, KeyError, TypeError):
+            message = response.text.strip() or response.reason
+        raise RedcapError('HTTP %d: %s' % (response.status_code, message), response.status_code)
+    return response.text
+
+
+def _transient(error):
+    import requests
+
+    if isinstance(error, RedcapError):
+        return error.status in RETRY_STATUS
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def _send_chunk(session, url, payload, retries, backoff, timeout):
+    attempts, start = 0, time.time()
+    while True:
+        attempts += 1
+        try:
+            body = post(session, url, payload, timeout)
+            return {'status': 'ok', 'imported': int(json.loads(body).get('count', 0)),
+                    'attempts': attempts, 'seconds': round(time.time() - start, 3), 'error': ''}
+        except Exception as error:
+            if attempts > retries or not _transient(error):
+                return {'status': 'error', 'imported': 0, 'attempts': attempts,
+                        'seconds': round(time.time() - start, 3),
+                        'error': '%s: %s' % (type(error).__name__, error)}
+            time.sleep(backoff * 2 ** (attempts - 1))
+
+
+def import_records(records, token, url=API_URL, chunk_size=500, max_workers=4, retries=3,
+                   backoff=1.0, timeout=120, overwrite='normal', session=None):
+    """
+    Import ``records`` into REDCap in chunks and account for every chunk.
+
+    :param records: DataFrame with the record id (alien_no) as its first column
+    :param token: REDCap API token
+    :param url: API endpoint
+    :param chunk_size: records per request
+    :param max_workers: chunks in flight at once (also the connection pool size)
+    :param retries: resends of a chunk after a transient failure
+    :param backoff: seconds before the first resend; doubled for each further one
+    :param timeout: seconds to wait for each response
+    :param overwrite: REDCap overwriteBehavior -- 'normal' never blanks stored values,
+                      'overwrite' replaces them with the blanks in ``records``
+    :param session: optional session to reuse (see make_session)
+    :returns: DataFrame with one row per chunk: first/last record, records sent, status,
+              records REDCap reported imported, attempts, seconds and error text
+    """
+    import pandas as pd
+
+    session = session or make_session(max_workers)
+    records = redcap_text(records)
+    record_ids = records.iloc[:, 0].tolist()
+    starts = range(0, len(records), chunk_size)
+
+    def send(start):
+        chunk = records.iloc[start:start + chunk_size]
+        payload = {
+            'token': token,
+            'content': 'record',
+            'format': 'csv',
+            'type': 'flat',
+            'overwriteBehavior': overwrite,
+            'returnContent': 'count',
+            'returnFormat': 'json',
+            'data': chunk.to_csv(index=False),
+        }
+        row = _send_chunk(session, url, payload, retries, backoff, timeout)
+        row.update(chunk=start // chunk_size, first_record=record_ids[start],
+                   last_record=record_ids[start + len(chunk) - 1], records=len(chunk))
+        return row
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        log = list(pool.map(send, starts))
+    columns = ['chunk', 'first_record', 'last_record', 'records', 'status', 'imported',
+               'attempts', 'seconds', 'error']
+    return pd.DataFrame(log, columns=columns)
+
+
+def export_records(record_ids, fields, token, url=API_URL, batch_size=500, max_workers=4,
+                   record_id='alien_no', timeout=120, session=None):
+    """
+    Export the stored values of ``fields`` for ``record_ids``, ``batch_size`` records a request.
+
+    :returns: DataFrame of strings, blank where REDCap holds no value; records that do not
+              exist in the project are simply absent
+    """
+    import pandas as pd
+
+    session = session or make_session(max_workers)
+    record_ids = [str(record) for record in record_ids]
+    fields = [record_id] + [field for field in fields if field != record_id]
+
+    def fetch(start):
+        payload = {'token': token, 'content': 'record', 'format': 'csv', 'type': 'flat',
+                   'rawOrLabel': 'raw', 'returnFormat': 'json'}
+        for i, record in enumerate(record_ids[start:start + batch_size]):
+            payload['records[%d]' % i] = record
+        for i, field in enumerate(fields):
+            payload['fields[%d]' % i] = field
+        text = post(session, url, payload, timeout)
+        if not text.strip():
+            return pd.DataFrame(columns=fields, dtype=object)
+        return pd.read_csv(io.StringIO(text), dtype=str, keep_default_na=False)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        batches = list(pool.map(fetch, range(0, len(record_ids), batch_size)))
+    if not batches:
+        return pd.DataFrame(columns=fields, dtype=object)
+    return pd.concat(batches, ignore_index=True, sort=False)
+
+
+def export_metadata(token, url=API_URL, timeout=120, session=None):
+    """Export the project's data dictionary; returns the CSV text (API column names)."""
+    session = session or make_session(1)
+    payload = {'token': token, 'content': 'metadata', 'format': 'csv', 'returnFormat': 'json'}
+    return post(session, url, payload, timeout)
+
+
+def redcap_text(frame):
+    """
+    Render every cell as the text REDCap stores: blank for missing values, numbers without a
+    trailing '.0' (1.0 -> '1'), dates as YYYY-MM-DD, surrounding whitespace removed. Cells that
+    are already text are kept as they are, so '02134' stays '02134'.
+    """
+    import numpy as np
+    import pandas as pd
+
+    text = {}
+    for column in frame.columns:
+        values = frame[column]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            text[column] = values.dt.strftime('%Y-%m-%d').fillna('')
+            continue
+        if values.dtype.kind == 'f':        # printed at their own precision: float32 170.18 -> '170.18'
+            array = values.to_numpy()
+            missing = np.isnan(array)
+            out = np.where(missing, '', array.astype(str)).astype(object)
+            integral = ~missing & (array % 1 == 0) & (np.abs(array) < 2 ** 53)
+            out[integral] = array[integral].astype('int64').astype(str)
+            text[column] = pd.Series(out, index=frame.index)
+            continue
+        values = values.astype(object)
+        out = values.where(values.notna(), '').astype(str).str.strip()
+        if pd.api.types.is_numeric_dtype(frame[column]):
+            numeric = values.notna().to_numpy()
+        else:
+            numeric = values.map(lambda value: isinstance(value, (int, float, np.number))
+                                 and not isinstance(value, bool)).to_numpy(dtype=bool)
+        number = pd.to_numeric(values[numeric], errors='coerce')
+        integral = ((number % 1 == 0) & (number.abs() < 2 ** 53)).to_numpy()
+        out.iloc[np.flatnonzero(numeric)[integral]] = number[integral].astype('int64').astype(str).to_numpy()
+        text[column] = out
+    return pd.DataFrame(text, index=frame.index, columns=frame.columns)
+
+
+def diff_records(new, current, record_id='alien_no'):
+    """
+    Compare ``new`` against the ``current`` REDCap values, column-wise and vectorized.
+
+    :param new: RESULT frame to upload
+    :param current: export of the same records (see export_records)
+    :returns: (delta frame holding only records and fields with a change to send -- unchanged
+               cells are blank, which REDCap's 'normal' import leaves untouched --,
+               summary dict with record/cell counts and a per-field 'fields' DataFrame)
+    """
+    import numpy as np
+    import pandas as pd
+
+    fields = [column for column in new.columns if column != record_id]
+    new_text = redcap_text(new[[record_id] + fields])
+    ids = new_text[record_id].to_numpy()
+
+    stored = redcap_text(current).drop_duplicates(record_id).set_index(record_id)
+    exists = pd.Index(stored.index).get_indexer(ids) >= 0
+    stored = stored.reindex(index=ids, columns=fields).fillna('')
+
+    new_values = new_text[fields].to_numpy()
+    changed = new_values != stored.to_numpy()
+    # - '60' and '60.0' are the same stored number
+    new_numbers = new_text[fields].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    stored_numbers = stored.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    changed &= ~(new_numbers == stored_numbers)
+    changed[~exists] = new_values[~exists] != ''       # new records: every filled cell
+    cleared = changed & (new_values == '')
+    send = changed & ~cleared
+
+    rows, columns = send.any(axis=1), send.any(axis=0)
+    keep = [field for field, used in zip(fields, columns) if used]
+    delta = new_text[fields].where(pd.DataFrame(send, index=new_text.index, columns=fields))[keep][rows]
+    delta.insert(0, record_id, new_text[record_id][rows])
+
+    summary = {
+        'new_records': int((~exists).sum()),
+        'changed_records': int((rows & exists).sum()),
+        'unchanged_records': int((~rows & exists).sum()),
+        'changed_cells': int(send.sum()),
+        'cleared_cells': int(cleared.sum()),
+        'fields': pd.DataFrame({'field': fields, 'changed': send.sum(axis=0),
+                                'cleared': cleared.sum(axis=0)})[columns | cleared.any(axis=0)]
+                    .reset_index(drop=True),
+    }
+    return delta.reset_index(drop=True), summary
+
+
+def delta_upload(records, token, url=API_URL, record_id='alien_no', batch_size=500,
+                 chunk_size=500, max_workers=4, **import_options):
+    """
+    Upload only what changed: export the current values, diff, and import the delta.
+
+    :param import_options: passed to import_records; overwrite must stay 'normal', since the
+                           delta leaves every unchanged cell blank
+    :returns: (import log -- see import_records --, diff summary -- see diff_records)
+    :raises ValueError: for an overwrite other than 'normal'
+    """
+    overwrite = import_options.get('overwrite', 'normal')
+    if overwrite != 'normal':
+        raise ValueError("delta_upload blanks unchanged cells, so overwrite=%r would erase them; "
+                         "use import_records to send full rows" % overwrite)
+    session = make_session(max_workers)
+    fields = [column for column in records.columns if column != record_id]
+    current = export_records(records[record_id], fields, token, url, batch_size, max_workers,
+                             record_id, session=session)
+    delta, summary = diff_records(records, current, record_id)
+    log = import_records(delta, token, url, chunk_size, max_workers, session=session, **import_options)
+    return log, summary
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Loader for the ARHCA workbook tabs the upload actually uses.
+
+  :notes:   Each required sheet is parsed in its own worker process; sheets the pipeline
+            never reads are not decoded at all (.xls books are opened on demand).
+
+            Worker processes are started with the platform's default method. Where that is
+            'spawn' (Windows), the module that started the run is re-imported in each worker,
+            so call load_sheets from Spyder/IPython, from a `if __name__ == '__main__':` block,
+            or pass max_workers=1 to parse in-process.
+
+            Parsed sheets are cached on disk by workbook content hash (bchc/cache.py), so a
+            rerun on the same file skips the parse entirely.
+
+            Tabs are found by their header row, not their position: detect_sheets() reads the
+            first row of every sheet and matches it against SHEET_SIGNATURES, so a tab BCHC
+            moves or adds is still found, and a workbook missing a tab fails before anything
+            is parsed. .xlsx header rows are read without decoding the rest of the sheet.
+            xlrd can only load an .xls sheet whole, so there the sheets at the usual positions
+            (SHEETS) are checked first, and the others are decoded only when a tab is not
+            where it usually is -- a tab found at its usual position is not checked for
+            duplicates elsewhere in the book. The role -> sheet map is cached by workbook
+            hash either way.
+
+            stream_sheet() reads one sheet in chunks of rows instead, for tabs where most rows
+            are thrown away (Orders): only the requested columns of one chunk are held as a
+            frame at a time. .xlsx sheets are read row by row (openpyxl read-only mode); xlrd
+            keeps an .xls sheet's cells in memory while it is read, but no frame of the whole
+            sheet is built.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from bchc import cache
+
+# - The ARHCA tabs the upload reads, at their usual positions
+SHEETS = {
+    'demographics': 0,      # Patient Demo
+    'user_fields': 2,       # User Defined Fields (alien_no)
+    'medcin': 3,            # Medcin
+    'orders': 4,            # Orders
+    'vitals': 6,            # Vitals
+    'immunizations': 8,     # Immunizations
+}
+
+# - Header columns that identify each tab (other columns may come and go)
+SHEET_SIGNATURES = {
+    'demographics': ('Patient #', 'Patient Name', 'Date of Birth'),
+    'user_fields': ('Patient #', 'Field Name', 'Value'),
+    'medcin': ('Patient #', 'Medcin Description', 'Result'),
+    'orders': ('Patient #', 'Order Description', 'Result Component'),
+    'vitals': ('Patient #', 'Height', 'Weight', 'BP'),
+    'immunizations': ('Patient #', 'Description'),
+}
+
+# - Cell text read_excel turns into NaN by default; stream_sheet does the same so that both
+#   readers hand the stages the same values
+NA_STRINGS = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+
+
+def parse_sheet(path, sheet):
+    """Parse one sheet of the workbook at ``path`` without decoding the others."""
+    import pandas as pd
+
+    if path.lower().endswith('.xls'):
+        import xlrd
+        book = xlrd.open_workbook(path, on_demand=True)
+        try:
+            return pd.read_excel(book, sheet_name=sheet, engine='xlrd')
+        finally:
+            book.release_resources()
+    return pd.read_excel(path, sheet_name=sheet)
+
+
+def _xls_rows(path, sheet):
+    import xlrd
+
+    book = xlrd.open_workbook(path, on_demand=True)
+    try:
+        table = book.sheet_by_name(sheet) if isinstance(sheet, str) else book.sheet_by_index(sheet)
+        for index in range(table.nrows):
+            row = []
+            for cell in table.row(index):
+                if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+                    row.append(None)
+                elif cell.ctype == xlrd.XL_CELL_DATE:
+                    row.append(xlrd.xldate.xldate_as_datetime(cell.value, book.datemode))
+                elif cell.ctype == xlrd.XL_CELL_NUMBER and cell.value.is_integer():
+                    row.append(int(cell.value))      # as read_excel does
+                elif cell.ctype == xlrd.XL_CELL_BOOLEAN:
+                    row.append(bool(cell.value))
+                else:
+                    row.append(cell.value)
+            yield row
+    finally:
+        book.release_resources()
+
+
+def _xlsx_rows(path, sheet):
+    import openpyxl
+
+    book = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        table = book[sheet] if isinstance(sheet, str) else book.worksheets[sheet]
+        for row in table.iter_rows(values_only=True):
+            yield row
+    finally:
+        book.close()
+
+
+def iter_rows(path, sheet):
+    """Cell values of one sheet, one tuple/list per row with the header row first; blanks are None."""
+    path = os.fspath(path)
+    return _xls_rows(path, sheet) if path.lower().endswith('.xls') else _xlsx_rows(path, sheet)
+
+
+def stream_sheet(path, sheet, columns=None, chunk_size=50000):
+    """
+    Read one sheet as a sequence of frames of at most ``chunk_size`` rows.
+
+    :param columns: header names to keep (in this order); None keeps every column
+    :raises KeyError: when a requested column is not in the header row
+    """
+    import pandas as pd
+
+    rows = iter_rows(path, sheet)
+    header = [str(name) if name is not None else 'Unnamed: %d' % i for i, name in enumerate(next(rows, ()))]
+    columns = header if columns is None else list(columns)
+    missing = [column for column in columns if column not in header]
+    if missing:
+        raise KeyError('columns not in sheet %r: %s' % (sheet, ', '.join(missing)))
+    positions = [header.index(column) for column in columns]
+
+    chunk, chunks = [], 0
+    for row in rows:
+        values = [row[position] if position < len(row) else None for position in positions]
+        values = [None if isinstance(value, str) and value in NA_STRINGS else value for value in values]
+        if any(value is not None for value in values):      # rows blank in these columns are skipped
+            chunk.append(values)
+        if len(chunk) >= chunk_size:
+            yield pd.DataFrame(chunk, columns=columns)
+            chunk, chunks = [], chunks + 1
+    if chunk or not chunks:
+        yield pd.DataFrame(chunk, columns=columns)
+
+
+def _xls_headers(path, positions=None):
+    import xlrd
+
+    book = xlrd.open_workbook(path, on_demand=True)
+    try:
+        headers = []
+        for index, name in enumerate(book.sheet_names()):
+            if positions is not None and index not in positions:
+                headers.append((name, None))
+                continue
+            table = book.sheet_by_index(index)
+            headers.append((name, [cell.value for cell in table.row(0)] if table.nrows else []))
+            book.unload_sheet(index)
+        return headers
+    finally:
+        book.release_resources()
+
+
+def _xlsx_headers(path):
+    import openpyxl
+
+    book = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        return [(table.title, list(next(table.iter_rows(max_row=1, values_only=True), ())))
+                for table in book.worksheets]
+    finally:
+        book.close()
+
+
+def read_headers(path, positions=None):
+    """
+    (sheet name, header cells) of every sheet of the workbook, in tab order.
+
+    :param positions: sheets to read; for an .xls the others are not decoded and get None
+                      cells (an .xlsx header row is cheap, so every sheet is read there)
+    """
+    path = os.fspath(path)
+    return _xls_headers(path, positions) if path.lower().endswith('.xls') else _xlsx_headers(path)
+
+
+def match_sheets(headers, signatures=SHEET_SIGNATURES):
+    """
+    Sheets whose header row holds every column of a signature.
+
+    :param headers: list of (sheet name, header cells), see read_headers; sheets with None
+                    cells (not read) match nothing
+    :returns: dict of {name: [positions of the matching sheets]}
+    """
+    columns = [set(str(cell).strip() for cell in cells or () if cell is not None) for _, cells in headers]
+    return dict((name, [position for position, header in enumerate(columns) if header.issuperset(signature)])
+                for name, signature in signatures.items())
+
+
+def detect_sheets(path, names=None, use_cache=True, cache_dir=None):
+    """
+    Position of each tab the upload reads, found by its header row (see SHEET_SIGNATURES).
+
+    :param names: tabs to find (default: all of SHEET_SIGNATURES)
+    :param use_cache: read/write the map in the on-disk cache
+    :param cache_dir: cache location, see cache.default_cache_dir
+    :returns: dict of {name: sheet position}
+    :raises ValueError: when no sheet, or more than one, matches a tab
+    """
+    path = os.fspath(path)
+    names = list(SHEET_SIGNATURES) if names is None else list(names)
+    signatures = dict((name, list(signature)) for name, signature in SHEET_SIGNATURES.items())
+    matches = None
+    if use_cache:
+        entry = cache.sheet_map_path(cache_dir or cache.default_cache_dir(path), cache.file_digest(path))
+        stored = cache.read_json(entry)
+        if stored and stored.get('signatures') == signatures:
+            matches = stored['matches']
+    if matches is None:
+        # - xlrd decodes an .xls sheet whole, so look at the usual positions first and read
+        #   the other sheets only when a tab is not where it usually is
+        headers = read_headers(path, set(SHEETS.values()))
+        matches = match_sheets(headers)
+        if any(cells is None for _, cells in headers) and \
+                any(matches[name] != [SHEETS[name]] for name in SHEET_SIGNATURES):
+            rest = read_headers(path, set(i for i, (_, cells) in enumerate(headers) if cells is None))
+            headers = [header if header[1] is not None else other for header, other in zip(headers, rest)]
+            matches = match_sheets(headers)
+        if use_cache:
+            cache.write_json({'signatures': signatures, 'sheets': [name for name, _ in headers],
+                              'matches': matches}, entry)
+
+    found = {}
+    for name in names:
+        positions = matches[name]
+        if len(positions) != 1:
+            raise ValueError('%s sheet with the columns %s in %s; choose it with --sheet %s=POSITION' % (
+                'no' if not positions else 'more than one (%s)' % ', '.join(map(str, positions)),
+                ', '.join(SHEET_SIGNATURES[name]), os.path.basename(path), name))
+        found[name] = positions[0]
+    return found
+
+
+def load_sheets(path, sheets=None, max_workers=None, use_cache=True, cache_dir=None,
+                cache_max_bytes=cache.CACHE_MAX_BYTES):
+    """
+    Parse the required sheets of an ARHCA workbook concurrently.
+
+    :param path: path of the .xls/.xlsx workbook
+    :param sheets: dict of {name: sheet index or name}; default: every tab of SHEETS, found
+                   by detect_sheets
+    :param max_workers: worker processes; defaults to one per sheet still to parse (capped at
+                        the CPU count), and 1 parses serially in this process
+    :param use_cache: read/write parsed sheets from the on-disk cache; False bypasses it
+    :param cache_dir: cache location, see cache.default_cache_dir
+    :param cache_max_bytes: size budget enforced after new entries are written
+    :returns: dict of {name: DataFrame}
+    """
+    path = os.fspath(path)
+    sheets = detect_sheets(path, use_cache=use_cache, cache_dir=cache_dir) if sheets is None else sheets
+
+    frames, entries = {}, {}
+    if use_cache:
+        cache_dir = cache_dir or cache.default_cache_dir(path)
+        digest = cache.file_digest(path)
+        for name, sheet in sheets.items():
+            entries[name] = cache.entry_path(cache_dir, digest, sheet)
+            frame = cache.read_entry(entries[name])
+            if frame is not None:
+                frames[name] = frame
+    missing = {name: sheet for name, sheet in sheets.items() if name not in frames}
+
+    if max_workers is None:
+        max_workers = min(len(missing), os.cpu_count() or 1)
+    if max_workers <= 1 or len(missing) <= 1:
+        parsed = {name: parse_sheet(path, sheet) for name, sheet in missing.items()}
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {name: pool.submit(parse_sheet, path, sheet) for name, sheet in missing.items()}
+            parsed = {name: future.result() for name, future in futures.items()}
+
+    if use_cache and parsed:
+        for name, frame in parsed.items():
+            cache.write_entry(frame, entries[name])
+        cache.evict(cache_dir, cache_max_bytes)
+    frames.update(parsed)
+    return {name: frames[name] for name in sheets}
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: The pipeline as a graph of stages whose outputs are memoized on disk, so a rerun
+            recomputes only the stages downstream of what changed.
+
+  :notes:   A Stage names its inputs -- sheets or other stages -- the code it runs and the
+            tables and options it reads. Its key hashes:
+
+                the keys of its inputs (a sheet's is the workbook digest and tab position, or
+                a hash of the parsed frame)
+                the code it runs -- functions, or whole modules such as bchc/immun.py -- as
+                the process loaded it: bytecode, constants and module tables (not the file
+                on disk, which may have been edited since)
+                its config (code tables, exclude lists, options)
+                the Python and pandas versions
+
+            so a stage's output is reused for as long as none of these change. Adding a vaccine
+            to VACCINE_REGISTRY -- in bchc/immun.py, or in a running session -- changes the
+            Immunizations key: Immunizations, assembly and finish run again, while User Defined
+            Fields, demographics, vitals, Medcin and Orders are read back from the memo -- and
+            their tabs are not even parsed.
+
+            Outputs are pickled into the parsed-sheet cache (bchc/cache.py) as <key>-<stage>.pkl
+            and evicted with it. Pickle rather than Arrow/Feather: pyarrow is not a dependency,
+            and stage outputs are tuples of frames, dicts and lists rather than single tables.
+
+            Code a stage does not list is not part of its key. When a stage starts depending on
+            another module or table, add it to the stage's `code` or `config`.
+"""
+import hashlib
+import inspect
+import os
+import re
+import sys
+import types
+
+from bchc import cache
+from bchc.trace import NULL_TRACER
+
+
+def _sha(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8') if isinstance(part, str) else part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _canonical(value):
+    """repr() that does not depend on the order of dicts and sets (set order changes between runs)."""
+    if isinstance(value, dict):
+        items = ('%s: %s' % (_canonical(key), _canonical(item)) for key, item in value.items())
+        return '{%s}' % ', '.join(sorted(items))
+    if isinstance(value, (set, frozenset)):
+        return '{%s}' % ', '.join(sorted(_canonical(item) for item in value))
+    if isinstance(value, (list, tuple)):
+        return '[%s]' % ', '.join(_canonical(item) for item in value)
+    if type(value).__repr__ is object.__repr__:     # <... object at 0x...> changes from run to run
+        return '<%s.%s>' % (type(value).__module__, type(value).__qualname__)
+    return repr(value)
+
+
+def _code_text(code):
+    """The parts of a code object that decide what it does -- bytecode, constants (nested
+    functions included), names -- but not its line numbers."""
+    consts = [_code_text(const) if isinstance(const, types.CodeType) else _canonical(const)
+              for const in code.co_consts]
+    return '%s|%s|%s|%s' % (code.co_code.hex(), '|'.join(consts), ','.join(code.co_names),
+                            ','.join(code.co_varnames))
+
+
+def _function_text(function):
+    function = inspect.unwrap(function)         # e.g. the function behind an lru_cache
+    return '%s|%s|%s' % (function.__qualname__, _code_text(function.__code__),
+                         _canonical(function.__defaults__ or ()))
+
+
+def _module_text(module):
+    """The module as loaded: its functions, the methods of its classes and its tables (UPPER_CASE
+    names, plain or with a leading underscore)."""
+    parts = []
+    for name, value in sorted(vars(module).items()):
+        if isinstance(value, types.FunctionType) or hasattr(value, '__wrapped__'):
+            if getattr(value, '__module__', None) == module.__name__:
+                parts.append(_function_text(value))
+        elif isinstance(value, type):
+            if value.__module__ == module.__name__:
+                parts.extend(_function_text(method) for _, method in sorted(vars(value).items())
+                             if isinstance(method, types.FunctionType))
+        elif name.lstrip('_').isupper() and isinstance(value, (dict, list, tuple, set, frozenset, str, int, float,
+                                                               type(None), re.Pattern)):
+            parts.append('%s=%s' % (name, _canonical(value)))
+    return '\n'.join(parts)
+
+
+def code_text(item):
+    """What the key hashes for a function or module in a stage's `code`: the code the process
+    has loaded, not the file on disk, which may have been edited since it was imported."""
+    return _module_text(item) if isinstance(item, types.ModuleType) else _function_text(item)
+
+
+def frame_digest(frame):
+    """Content hash of a DataFrame: columns, dtypes, index and every value."""
+    import pandas as pd
+
+    return _sha(repr([(str(column), str(dtype)) for column, dtype in frame.dtypes.items()]),
+                pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+
+
+class Stage(object):
+    """
+    One node of the graph.
+
+    :param name: stage name, also the span name in traces
+    :param inputs: names of stages or sheets -- a name is an earlier stage when there is one,
+                   else a sheet; ``(name, i)`` passes item i of a stage's output
+    :param function: called as function(*inputs, tracer=tracer, **options)
+    :param code: functions and modules whose loaded code (see code_text) is part of the key
+    :param config: values (tables, options) whose repr is part of the key
+    :param options: keyword arguments for ``function`` that are not part of the key
+    """
+
+    def __init__(self, name, inputs, function, code=(), config=(), options=None):
+        self.name = name
+        self.inputs = [item if isinstance(item, tuple) else (item, None) for item in inputs]
+        self.function = function
+        self.code = code
+        self.config = config
+        self.options = options or {}
+
+    def version(self):
+        import pandas as pd
+
+        return _sha(sys.version, pd.__version__, _canonical(self.config), *[code_text(item) for item in self.code])
+
+
+class StageGraph(object):
+    """
+    Runs stages in order, reading each from the memo when its key is there.
+
+    :param stages: list of Stage, each after the stages it takes as input
+    :param sources: dict of {sheet name: frame, or a callable returning it when first needed}
+    :param fingerprints: dict of {sheet name: string identifying its contents}; sheets without
+                         one are hashed (frame_digest) when a key is needed
+    :param memo_dir: directory of the memo; None runs every stage and stores nothing
+    :param tracer: trace.Tracer; every stage is a span, marked memo=True when read back
+    """
+
+    def __init__(self, stages, sources, fingerprints=None, memo_dir=None, tracer=NULL_TRACER):
+        self.stages = {}
+        self.inputs = {}        # stage -> [(is a stage, name, item)]
+        for stage in stages:
+            self.inputs[stage.name] = [(name in self.stages, name, item) for name, item in stage.inputs]
+            self.stages[stage.name] = stage
+        self.order = [stage.name for stage in stages]
+        self.sources = dict(sources)
+        self.fingerprints = dict(fingerprints or {})
+        self.memo_dir = memo_dir
+        self.tracer = tracer
+        self.status = {}
+        self._keys = {}
+        self._values = {}
+
+    def key(self, name, is_stage=True):
+        """Memo key of a stage, or of a sheet with ``is_stage=False``."""
+        if (is_stage, name) not in self._keys:
+            if is_stage:
+                parts = [self.key(source, is_source_stage) for is_source_stage, source, _ in self.inputs[name]]
+                key = _sha('stage', name, self.stages[name].version(), *parts)
+            else:
+                key = _sha('sheet', name, self.fingerprints.get(name) or frame_digest(self.source(name)))
+            self._keys[is_stage, name] = key
+        return self._keys[is_stage, name]
+
+    def _entry(self, name):
+        return cache.entry_path(self.memo_dir, self.key(name), name) if self.memo_dir else None
+
+    def source(self, name):
+        """A sheet, loaded first when it was given as a callable."""
+        value = self.sources[name]
+        if callable(value):
+            value = self.sources[name] = value()
+        return value
+
+    def needed_sources(self, names=None):
+        """Sheets that running ``names`` (default: every stage) will read -- those feeding a stage
+        that is not in the memo."""
+        needed, seen = [], set()
+
+        def visit(name):
+            if name in seen or (self.memo_dir and os.path.exists(self._entry(name))):
+                return
+            seen.add(name)
+            for is_stage, source, _ in self.inputs[name]:
+                if is_stage:
+                    visit(source)
+                elif source not in needed:
+                    needed.append(source)
+
+        for name in names or self.order:
+            visit(name)
+        return needed
+
+    def _input(self, is_stage, name, item):
+        value = self.value(name) if is_stage else self.source(name)
+        return value if item is None else value[item]
+
+    def value(self, name):
+        """Output of a stage, read from the memo or run."""
+        if name in self._values:
+            return self._values[name]
+        stage = self.stages[name]
+        entry = self._entry(name)
+        value = cache.read_entry(entry) if entry else None
+        if value is not None:
+            with self.tracer.span(name, memo=True) as span:
+                span.output(value[0] if isinstance(value, tuple) else value)
+            self.status[name] = 'reused'
+        else:
+            inputs = [self._input(*source) for source in self.inputs[name]]
+            first = inputs[0] if inputs else None
+            with self.tracer.span(name, first[0] if isinstance(first, tuple) else first) as span:
+                value = stage.function(*inputs, tracer=self.tracer, **stage.options)
+                span.output(value[0] if isinstance(value, tuple) else value)
+            if entry:
+                cache.write_entry(value, entry)
+            self.status[name] = 'ran'
+        self._values[name] = value
+        return value
+
+    def run(self):
+        """Every stage in order; returns {stage: output}."""
+        outputs = dict((name, self.value(name)) for name in self.order)
+        if self.memo_dir:
+            cache.evict(self.memo_dir)
+        return outputs
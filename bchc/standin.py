@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Local stand-in for the REDCap API, for trying imports without touching the
+            real project.
+
+  :notes:   Keeps records in memory and speaks the subset of the API that bchc uses:
+            record import (csv/json, normal/overwrite), record export (csv/json, optionally
+            limited by records[] and fields[]) and, when one is given, metadata export of a
+            data dictionary. Errors are returned the way REDCap
+            returns them -- an HTTP 400/403 with {"error": "..."}.
+
+            Usage:  python -m bchc.standin --port 8080 --token TEST
+                    then import against http://127.0.0.1:8080/api/ with token TEST
+"""
+import argparse
+import csv
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class StandinProject(object):
+    """In-memory REDCap project: {record id: {field: value}}."""
+
+    def __init__(self, token='', record_id='alien_no', fields=None, metadata=None):
+        self.token = token
+        self.record_id = record_id
+        self.fields = set(fields) if fields else None     # None accepts any field
+        self.metadata = metadata                          # data dictionary CSV text
+        self.records = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def import_records(self, rows, overwrite='normal'):
+        for row in rows:
+            if self.record_id not in row or not row[self.record_id]:
+                raise ValueError('record is missing %s' % self.record_id)
+            unknown = set(row) - self.fields - {self.record_id} if self.fields is not None else ()
+            if unknown:
+                raise ValueError('The following fields were not found in the project: %s'
+                                 % ', '.join(sorted(unknown)))
+        with self.lock:
+            for row in rows:
+                record = self.records.setdefault(row[self.record_id], {})
+                for field, value in row.items():
+                    if value != '' or overwrite == 'overwrite':
+                        record[field] = value
+        return len(rows)
+
+    def export_records(self, records=None, fields=None):
+        with self.lock:
+            ids = [record for record in (records or self.records) if record in self.records]
+            if not fields:
+                fields = sorted(set(field for record in self.records.values() for field in record))
+            fields = [self.record_id] + [field for field in fields if field != self.record_id]
+            return fields, [dict((field, self.records[record].get(field, '')) for field in fields)
+                            for record in ids]
+
+    def handle(self, form):
+        """Answer one API request; returns (HTTP status, JSON-able body or CSV text)."""
+        with self.lock:
+            self.requests += 1
+        if form.get('token') != self.token:
+            return 403, {'error': 'You do not have permissions to use the API'}
+        content, action = form.get('content'), form.get('action', 'import' if 'data' in form else 'export')
+        try:
+            if content == 'record' and action == 'import':
+                if form.get('format', 'json') == 'csv':
+                    rows = list(csv.DictReader(io.StringIO(form.get('data', ''))))
+                else:
+                    rows = [dict((key, '' if value is None else str(value)) for key, value in row.items())
+                            for row in json.loads(form.get('data') or '[]')]
+                return 200, {'count': self.import_records(rows, form.get('overwriteBehavior', 'normal'))}
+            if content == 'record' and action == 'export':
+                fields, rows = self.export_records(form.get('records'), form.get('fields'))
+                if form.get('format', 'json') != 'csv':
+                    return 200, rows
+                out = io.StringIO()
+                writer = csv.DictWriter(out, fields, lineterminator='\n')
+                writer.writeheader()
+                writer.writerows(rows)
+                return 200, out.getvalue()
+            if content == 'metadata' and self.metadata is not None:
+                return 200, self.metadata
+        except ValueError as error:
+            return 400, {'error': str(error)}
+        return 400, {'error': 'The value of the parameter "content" is not valid'}
+
+
+def make_server(project, host='127.0.0.1', port=0):
+    """An HTTP server answering API requests for ``project``; port 0 picks a free port."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+            form = {}
+            for key, values in parse_qs(body, keep_blank_values=True).items():
+                if key.endswith(']'):      # PHP-style arrays: records[0]=..&records[1]=..
+                    form.setdefault(key[:key.index('[')], []).extend(values)
+                else:
+                    form[key] = values[-1]
+            status, payload = project.handle(form)
+            if isinstance(payload, str):
+                data, content_type = payload.encode('utf-8'), 'text/csv'
+            else:
+                data, content_type = json.dumps(payload).encode('utf-8'), 'application/json'
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bchc.standin',
+                                     description='Serve a local stand-in for the REDCap API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--token', default='', help='API token clients must send')
+    parser.add_argument('--metadata', help='data dictionary CSV to serve as the metadata export')
+    args = parser.parse_args(argv)
+
+    metadata = None
+    if args.metadata:
+        with open(args.metadata, encoding='utf-8-sig') as handle:
+            metadata = handle.read()
+    server = make_server(StandinProject(args.token, metadata=metadata), args.host, args.port)
+    print('REDCap stand-in listening on http://%s:%d/api/' % server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Synthetic ARHCA workbooks -- made-up patients in the Bluegrass sheet layout, for
+            testing and benchmarking the pipeline without touching PHI.
+
+  :notes:   generate_sheets() builds the six tabs the upload reads (keyed like SHEETS) with the
+            same columns and the same kind of values Bluegrass sends: insurers, Medcin questions,
+            order panels and their result components, vaccines from the registry, plus rows the
+            exclude lists are there to remove. Patients get a random number of order panels and
+            immunizations, and a share of them get the problems real files have -- a misspelled
+            urinalysis result or vaccine description, an A# shared with (or one off from)
+            another patient's, an A# that is not a number.
+
+            Nothing here is real: names are 'PATIENT <n>', A#s are random. The same seed gives
+            the same workbook.
+
+            Usage:  python -m bchc.synth ARHCA_1-2018.xlsx --patients 1000 [--seed 0] [--shuffle-tabs]
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from bchc.codes import DEMOGRAPHIC_CODES, MEDCIN_CODES, MEDICAID_PLANS
+from bchc.filters import IMMUN_EXCLUDE, MEDCIN_EXCLUDE
+from bchc.immun import VACCINE_REGISTRY
+from bchc.pipeline import MEDCIN_COLUMNS
+from bchc.sheets import SHEETS
+
+EXCEL_MAX_ROWS = 1048576
+
+# - Tab names; the pipeline goes by header row (sheets.detect_sheets), the others are filler
+SHEET_NAMES = {
+    'demographics': 'Patient Demo',
+    'user_fields': 'User Defined Fields',
+    'medcin': 'Medcin',
+    'orders': 'Orders',
+    'vitals': 'Vitals',
+    'immunizations': 'Immunizations',
+}
+FILLER_SHEETS = ['Encounters', 'Problems', 'Medications', 'Allergies']
+
+INSURERS = MEDICAID_PLANS + ['SELF PAY', 'MEDICAID ']        # an unmapped plan and a trailing space
+COUNTRIES = ['Iraq', 'Syria', 'Somalia', 'Democratic Republic of the Congo', 'Bhutan', 'Burma',
+             'Cuba', 'Afghanistan', 'Eritrea', 'Ukraine']
+DEPARTURE_COUNTRIES = ['Turkey', 'Jordan', 'Kenya', 'Tanzania', 'Nepal', 'Thailand', 'Cuba', 'Uganda']
+LANGUAGES = ['Arabic', 'Somali', 'Swahili', 'Nepali', 'Spanish', 'Dari', 'Tigrinya', 'Ukrainian']
+
+UA_RESULTS = ['Negative'] * 8 + ['negative', 'neg', 'Trace', 'Trace-Lysed', 'Small', 'Moderate',
+                                 'Large', 'None', '100', 'Not Performed']
+REACTIVE_RESULTS = ['NON-REACTIVE'] * 9 + ['REACTIVE']
+VISION_RESULTS = ['20', '20', '25', '30', '40', '50', '70', '200']
+
+# - Order panels: (order code, order description, relative frequency,
+#                  [(result component, (mean, sd) of a number or list of text results)])
+#   Components and orders the exclude lists remove are included on purpose.
+ORDER_PANELS = [
+    ('85025', 'CBC', 10, [
+        ('WHITE BLOOD CELL COUNT', (7.0, 2.2)), ('HEMOGLOBIN', (13.6, 1.7)), ('HEMATOCRIT', (40.5, 4.8)),
+        ('MCV', (86.0, 7.0)), ('RDW', (13.6, 1.4)), ('PLATELET COUNT', (255.0, 70.0)),
+        ('MCHC', (33.4, 1.1)), ('MPV', (10.2, 1.0)), ('LYMPHOCYTES', (32.0, 8.0)),
+        ('NEUTROPHILS', (55.0, 9.0)), ('EOSINOPHILS', (3.0, 2.5)), ('ABSOLUTE NEUTROPHILS', (3.9, 1.5)),
+    ]),
+    ('80053', 'CMP', 9, [
+        ('SODIUM', (139.0, 2.5)), ('POTASSIUM', (4.2, 0.4)), ('CHLORIDE', (103.0, 3.0)),
+        ('GLUCOSE', (95.0, 22.0)), ('CALCIUM', (9.4, 0.4)), ('CREATININE', (0.85, 0.2)),
+        ('ALBUMIN', (4.3, 0.4)), ('PROTEIN, TOTAL', (7.4, 0.5)), ('BILIRUBIN, TOTAL', (0.6, 0.3)),
+        ('ALT', (24.0, 12.0)), ('AST', (23.0, 9.0)), ('BUN', (13.0, 4.0)), ('CARBON DIOXIDE', (25.0, 2.5)),
+        ('ALKALINE PHOSPHATASE', (80.0, 25.0)), ('GLOBULIN', (3.1, 0.4)), ('eGFR', (95.0, 18.0)),
+    ]),
+    ('81003', 'URINALYSIS, AUTO, W/O SCOPE', 8, [
+        ('Blood', UA_RESULTS), ('Glucose', UA_RESULTS), ('Protein', UA_RESULTS),
+        ('Specific Gravity', (1.015, 0.006)), ('pH', (6.0, 0.7)), ('Ketones', ['Negative']),
+        ('Nitrite', ['Negative']), ('Leukocytes', ['Negative', 'Trace']),
+    ]),
+    ('87340', 'HEPATITIS B SURFACE ANTIGEN (HBsAG)', 7, [('HEPATITIS B SURFACE$ANTIGEN', REACTIVE_RESULTS)]),
+    ('86706', 'HEP B SURFACE ANTIBODY', 7, [('HEPATITIS B SURFACE ANTIBODY QL', REACTIVE_RESULTS)]),
+    ('86704', 'HEPATITIS B CORE AB TOTAL', 7, [('HEPATITIS B CORE AB TOTAL', REACTIVE_RESULTS)]),
+    ('86480', 'TB AG RESPONSE T-CELL SUSP', 7, [('TSPOT', ['Negative'] * 9 + ['Positive'])]),
+    ('99173', 'VISUAL ACUITY SCREEN', 6, [('Right Eye', VISION_RESULTS), ('Left Eye', VISION_RESULTS),
+                                          ('Both Eyes', VISION_RESULTS)]),
+    ('80061', 'LIPID PANEL', 5, [
+        ('CHOLESTEROL, TOTAL', (185.0, 38.0)), ('HDL CHOLESTEROL', (48.0, 12.0)),
+        ('TRIGLYCERIDES', (130.0, 60.0)), ('LDL-CHOLESTEROL', (110.0, 32.0)),
+        ('CHOL/HDLC', (3.9, 1.0)), ('NON-HDL CHOLESTEROL', (137.0, 35.0)),
+    ]),
+    ('87177', 'OVA AND PARASITES, STOOL CONC/PERM SMEAR, 2 SPEC', 5, [
+        ('CONCENTRATE', ['No ova or parasites seen']), ('TRICHROME', ['No ova or parasites seen']),
+    ]),
+    ('86592', 'SYPHILIS TEST, NON-TREP, QUALITATIVE', 4, [
+        ('RPR (DX) W/REFL TITER AND CONFIRMATORY TESTING', ['NON-REACTIVE'] * 19 + ['REACTIVE']),
+    ]),
+    ('81025', 'URINE PREGNANCY TEST', 3, [('URINE PREGNANCY TEST', ['Negative'] * 9 + ['Positive'])]),
+    ('86787', 'VARICELLA-ZOSTER ANTIBODY', 2, [('VARICELLA AB', ['Immune'])]),
+    ('96127', 'RHS-15', 3, [('RHS 15 Score', (6.0, 6.0))]),
+]
+
+IGNORED_IMMUNIZATIONS = ['Immunizations Reviewed And Current', 'Immunization Record Unavailable']
+
+
+def typo(value, rng):
+    """``value`` with one character dropped, doubled, swapped with its neighbour or replaced."""
+    if len(value) < 3:
+        return value
+    i = int(rng.integers(1, len(value) - 1))
+    kind = int(rng.integers(4))
+    if kind == 0:
+        return value[:i] + value[i + 1:]
+    if kind == 1:
+        return value[:i] + value[i] + value[i:]
+    if kind == 2:
+        return value[:i - 1] + value[i] + value[i - 1] + value[i + 1:]
+    return value[:i] + 'aeiourtn'[int(rng.integers(8))] + value[i + 1:]
+
+
+def _misspell(values, rate, rng, variants=2):
+    """
+    Replace a ``rate`` share of ``values`` (object array) with a misspelling. Each distinct value
+    has only ``variants`` misspellings, since the same typo tends to come back month after month.
+    """
+    values = values.copy()
+    rows = np.flatnonzero(rng.random(len(values)) < rate)
+    spellings = {}
+    for i, pick in zip(rows, rng.integers(variants, size=len(rows))):
+        value = str(values[i])
+        if value not in spellings:
+            spellings[value] = [typo(value, rng) for _ in range(variants)]
+        values[i] = spellings[value][pick]
+    return values
+
+
+def _choose(options, size, rng):
+    return np.asarray(options, dtype=object)[rng.integers(len(options), size=size)]
+
+
+def _alien_values(count, duplicate_rate, invalid_rate, rng):
+    """Raw A# cells: 9-digit numbers (some typed 'A###-###-###'), with injected conflicts."""
+    numbers = rng.choice(np.arange(100000000, 230000000, 7), size=count, replace=False).astype(object)
+    shared = np.flatnonzero(rng.random(count) < duplicate_rate)
+    for i in shared:
+        other = int(rng.integers(count))
+        numbers[i] = numbers[other] + (int(rng.integers(2)) if other != i else 1)      # same or one off
+    values = numbers.copy()
+    typed = rng.random(count) < 0.1
+    values[typed] = ['A%03d-%03d-%03d' % (n // 1000000, n // 1000 % 1000, n % 1000) for n in numbers[typed]]
+    invalid = np.flatnonzero(rng.random(count) < invalid_rate)
+    values[invalid] = _choose(['000', 'PENDING', '12345', None], len(invalid), rng)
+    return values
+
+
+def generate_sheets(patients=1000, orders=6.0, immunizations=3.0, typo_rate=0.02, duplicate_rate=0.005,
+                    invalid_rate=0.002, seed=0, first_patient=100000):
+    """
+    Build the parsed tabs of a synthetic ARHCA workbook.
+
+    :param patients: number of patients
+    :param orders: average number of order panels per patient (each panel has 1-16 components)
+    :param immunizations: average number of immunization rows per patient
+    :param typo_rate: share of urinalysis results and vaccine descriptions that are misspelled
+    :param duplicate_rate: share of A#s copied from, or one off from, another patient's
+    :param invalid_rate: share of A# cells that are not A#s ('000', 'PENDING', blank)
+    :param seed: random seed
+    :param first_patient: first Bluegrass Patient #
+    :returns: dict of {name: DataFrame} keyed like sheets.SHEETS, as sheets.load_sheets returns
+    """
+    rng = np.random.default_rng(seed)
+    patient = np.arange(first_patient, first_patient + patients)
+
+    user_fields = pd.DataFrame({'Patient #': patient, 'Field Name': 'A#',
+                                'Value': _alien_values(patients, duplicate_rate, invalid_rate, rng)})
+
+    birth = pd.Timestamp('2017-01-01') - pd.to_timedelta(rng.integers(365, 365 * 75, patients), unit='D')
+    demographics = pd.DataFrame({
+        'Patient #': patient,
+        'Patient Name': np.char.add('PATIENT ', patient.astype(str)).astype(object),
+        'Date of Birth': birth,
+        'Age': ((pd.Timestamp('2018-01-01') - birth).days // 365).astype('int64'),
+        'Gender': _choose(['M', 'F'], patients, rng),
+        'Marriage Status': _choose(list(DEMOGRAPHIC_CODES['marriage_status']), patients, rng),
+        'Insurance': _choose(INSURERS, patients, rng),
+        'Resettlement Agency': _choose(['KRM'] * 4 + ['CATHOLIC CHARITIES'], patients, rng),
+        'Zip Code': rng.integers(40202, 40299, patients).astype(float),
+    })
+    demographics.loc[rng.random(patients) < 0.05, 'Insurance'] = None
+
+    return {
+        'demographics': demographics,
+        'user_fields': user_fields,
+        'medcin': _medcin(patient, rng),
+        'orders': _orders(patient, orders, typo_rate, rng),
+        'vitals': _vitals(patient, rng),
+        'immunizations': _immunizations(patient, immunizations, typo_rate, rng),
+    }
+
+
+def _medcin(patient, rng):
+    count = len(patient)
+    # - every patient: country of origin/departure, arrival date, half of them a preferred language
+    arrival = pd.Timestamp('2017-06-01') + pd.to_timedelta(rng.integers(0, 180, count), unit='D')
+    language = rng.random(count) < 0.5
+    notes = [
+        pd.DataFrame({'Patient #': patient, 'Medcin Description': 'Country of Origin',
+                      'Note': _choose(COUNTRIES, count, rng), 'Result': None}),
+        pd.DataFrame({'Patient #': patient, 'Medcin Description': 'Country of Departure',
+                      'Note': _choose(DEPARTURE_COUNTRIES, count, rng), 'Result': None}),
+        pd.DataFrame({'Patient #': patient, 'Medcin Description': 'Date of U.S. Arrival',
+                      'Note': arrival.strftime('%m/%d/%Y'), 'Result': None}),
+        pd.DataFrame({'Patient #': patient[language], 'Medcin Description': 'preferred language',
+                      'Note': _choose(LANGUAGES, int(language.sum()), rng), 'Result': None}),
+    ]
+    # - a random subset of the questions, answered from each field's own choices, and some rows
+    #   the exclude list drops
+    answers = []
+    for description, field in MEDCIN_COLUMNS.items():
+        asked = patient[rng.random(count) < 0.6]
+        choices = list(MEDCIN_CODES[field])
+        weights = np.array([6.0 if answer == 'N' else 2.0 if answer == 'Y' else 0.5 for answer in choices])
+        result = np.asarray(choices, dtype=object)[rng.choice(len(choices), len(asked), p=weights / weights.sum())]
+        answers.append(pd.DataFrame({'Patient #': asked, 'Medcin Description': description,
+                                     'Note': None, 'Result': result}))
+    # - a tenth of the answers are given again at a later visit, one in twenty of those differently
+    answered = pd.concat(answers, ignore_index=True)
+    repeated = answered[rng.random(len(answered)) < 0.1]
+    changed = (rng.random(len(repeated)) < 0.05) & repeated['Result'].isin(['N', 'Y']).to_numpy()
+    flipped = repeated['Result'].map({'N': 'Y', 'Y': 'N'})
+    answers.append(repeated.assign(Result=repeated['Result'].mask(changed, flipped)))
+    excluded = rng.random(count) < 0.3
+    extra = pd.DataFrame({'Patient #': patient[excluded],
+                          'Medcin Description': _choose(MEDCIN_EXCLUDE, int(excluded.sum()), rng),
+                          'Note': 'see scanned records', 'Result': None})
+
+    medcin = pd.concat(notes + answers + [extra], ignore_index=True)
+    medcin = medcin.sort_values('Patient #', kind='mergesort', ignore_index=True)
+    medcin.insert(1, 'Enc Date', '01/15/2018')
+    medcin.insert(2, 'Medcin Id', rng.integers(1000, 99999, len(medcin)))
+    medcin.insert(4, 'Value', None)
+    medcin.insert(6, 'Onset Date', None)
+    return medcin
+
+
+def _orders(patient, orders, typo_rate, rng):
+    weights = np.array([panel[2] for panel in ORDER_PANELS], dtype=float)
+    chance = np.minimum(1.0, weights * orders / weights.sum())
+    parts = []
+    for (code, description, _, components), probability in zip(ORDER_PANELS, chance):
+        ordered = patient[rng.random(len(patient)) < probability]
+        for component, values in components:
+            if isinstance(values, tuple):
+                mean, sd = values
+                decimals = 0 if mean >= 100 else 1 if mean >= 10 else 2 if mean >= 0.5 else 3
+                numbers = np.abs(rng.normal(mean, sd, len(ordered))).round(decimals)
+                result = numbers.astype(str).astype(object)
+                if decimals == 0:
+                    result = numbers.astype('int64').astype(str).astype(object)
+            else:
+                result = _choose(values, len(ordered), rng)
+                if values is UA_RESULTS:
+                    result = _misspell(result, typo_rate, rng)
+            parts.append(pd.DataFrame({'Patient #': ordered, 'Order Code': code, 'Order Description': description,
+                                       'Result Component': component, 'Result': result}))
+    frame = pd.concat(parts, ignore_index=True)
+    return frame.sort_values('Patient #', kind='mergesort', ignore_index=True)
+
+
+def _vitals(patient, rng):
+    visits = rng.integers(1, 4, len(patient))
+    count = int(visits.sum())
+    height = rng.normal(64.0, 4.0, count).round(1)
+    weight = rng.normal(150.0, 30.0, count).round(1)
+    systolic = rng.normal(122, 14, count).astype(int)
+    diastolic = rng.normal(78, 9, count).astype(int)
+    vitals = pd.DataFrame({
+        'Patient #': np.repeat(patient, visits),
+        'Date': pd.Timestamp('2018-01-15') + pd.to_timedelta(rng.integers(0, 60, count), unit='D'),
+        'Height': height,
+        'Weight': weight,
+        'BP': np.char.add(np.char.add(systolic.astype(str), '/'), diastolic.astype(str)).astype(object),
+        'BMI': (703 * weight / height ** 2).round(1),
+    })
+    # - the odd reading nobody could take or type
+    unreadable = np.flatnonzero(rng.random(count) < 0.005)
+    vitals.loc[unreadable, 'BP'] = _choose(['refused', '120/', None], len(unreadable), rng)
+    return vitals
+
+
+def _immunizations(patient, immunizations, typo_rate, rng):
+    doses = rng.poisson(immunizations, len(patient))
+    count = int(doses.sum())
+    description = _choose(list(VACCINE_REGISTRY) + IGNORED_IMMUNIZATIONS + IMMUN_EXCLUDE, count, rng)
+    description = _misspell(description, typo_rate, rng)
+    return pd.DataFrame({
+        'Patient #': np.repeat(patient, doses),
+        'Code': rng.integers(90000, 91000, count),
+        'Description': description,
+        'Date Ordered': pd.Timestamp('2018-01-15') + pd.to_timedelta(rng.integers(0, 60, count), unit='D'),
+    })
+
+
+def write_workbook(sheets, path, positions=None):
+    """
+    Write ``sheets`` (see generate_sheets) as an .xlsx, filling the gaps with filler tabs.
+
+    :param positions: dict of {name: tab position} (default: SHEETS); other orders test the
+                      header-row detection
+    :raises ValueError: when a tab has more rows than an Excel sheet holds
+    """
+    for name, frame in sheets.items():
+        if len(frame) >= EXCEL_MAX_ROWS:
+            raise ValueError('%s has %d rows; an Excel sheet holds %d' % (name, len(frame), EXCEL_MAX_ROWS - 1))
+    positions = dict((position, name) for name, position in (SHEETS if positions is None else positions).items())
+    filler = iter(FILLER_SHEETS + ['Sheet%d' % i for i in range(1, 100)])
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for position in range(max(positions) + 1):
+            if position in positions:
+                name = positions[position]
+                sheets[name].to_excel(writer, sheet_name=SHEET_NAMES[name], index=False)
+            else:
+                pd.DataFrame({'Patient #': []}).to_excel(writer, sheet_name=next(filler), index=False)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bchc.synth',
+                                     description='Write a synthetic ARHCA workbook (no real patient data).')
+    parser.add_argument('output', help='.xlsx workbook to write')
+    parser.add_argument('--patients', type=int, default=1000)
+    parser.add_argument('--orders', type=float, default=6.0, help='average order panels per patient')
+    parser.add_argument('--immunizations', type=float, default=3.0, help='average immunizations per patient')
+    parser.add_argument('--typo-rate', type=float, default=0.02)
+    parser.add_argument('--duplicate-rate', type=float, default=0.005)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--shuffle-tabs', action='store_true', help='put the tabs at random positions')
+    args = parser.parse_args(argv)
+
+    sheets = generate_sheets(args.patients, args.orders, args.immunizations, args.typo_rate,
+                             args.duplicate_rate, seed=args.seed)
+    positions = None
+    if args.shuffle_tabs:
+        order = np.random.default_rng(args.seed).permutation(len(SHEETS) + len(FILLER_SHEETS))
+        positions = dict((name, int(position)) for name, position in zip(SHEETS, order))
+    try:
+        write_workbook(sheets, args.output, positions)
+    except ValueError as error:
+        parser.error(str(error))
+    print('%s: %s' % (args.output, ', '.join('%s %d rows' % (name, len(frame)) for name, frame in sheets.items())))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Lightweight stage tracing -- wall time, peak memory growth and rows/columns in and
+            out of every pipeline step, as JSON lines and optionally a Chrome trace.
+
+  :notes:   The pipeline opens a span around each step (sheet load, filter, pivot, encode,
+            join, range check, write). A span costs two clock reads and two getrusage() calls,
+            so tracing can stay on in production; without a tracer the spans are no-ops.
+
+            Each finished span is one JSON line: run id, stage ('orders.filter' for a step
+            inside the Orders stage), start time, seconds, peak_rss_delta (how much the
+            process's peak resident memory grew during the step -- 0 when it stayed below an
+            earlier peak; None on Windows), rows_in/columns_in, rows_out/columns_out and
+            rows_dropped. A step that drops rows -- the A# filter, the exclude lists -- shows it.
+
+            The Chrome trace file opens in chrome://tracing or https://ui.perfetto.dev and shows
+            the steps nested on a timeline.
+"""
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:         # Windows
+    resource = None
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None where the OS does not report it."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024      # Linux reports KiB
+
+
+def shape(value):
+    """(rows, columns) of a DataFrame, Series (1 column) or dict/list of frames; None otherwise."""
+    if value is None:
+        return None, None
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (list, tuple)):
+        shapes = [shape(item) for item in value]
+        return (sum(rows or 0 for rows, _ in shapes), sum(columns or 0 for _, columns in shapes))
+    dimensions = getattr(value, 'shape', None)
+    if dimensions is None:
+        return None, None
+    return dimensions[0], dimensions[1] if len(dimensions) > 1 else 1
+
+
+class Span(object):
+    """One traced step; call output() with what the step produced."""
+
+    def __init__(self, stage, args):
+        self.stage = stage
+        self.args = args
+        self.rows_in = self.columns_in = self.rows_out = self.columns_out = None
+
+    def input(self, value):
+        self.rows_in, self.columns_in = shape(value)
+
+    def output(self, value):
+        self.rows_out, self.columns_out = shape(value)
+
+    def set(self, **args):
+        self.args.update(args)
+
+
+class NullTracer(object):
+    """Tracer that records nothing; used when no tracer is given."""
+
+    @contextmanager
+    def span(self, name, value=None, **args):
+        yield Span(name, args)
+
+    def close(self):
+        pass
+
+
+NULL_TRACER = NullTracer()
+
+
+class Tracer(object):
+    """
+    Records spans to a JSON lines file and, on close(), a Chrome trace.
+
+    :param path: JSON lines file the spans are appended to (None keeps them in `records` only)
+    :param chrome_path: Chrome trace (JSON) written by close()
+    :param run: run id written with every span (default: the start time)
+    """
+
+    def __init__(self, path=None, chrome_path=None, run=None):
+        self.path = path
+        self.chrome_path = chrome_path
+        self.run = run or time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.records = []
+        self._stack = []
+        self._origin = time.perf_counter()
+        self._handle = open(path, 'a', encoding='utf-8') if path else None
+
+    @contextmanager
+    def span(self, name, value=None, **args):
+        """
+        Trace the enclosed step.
+
+        :param name: step name, prefixed with the enclosing span's ('orders' -> 'orders.pivot')
+        :param value: the step's input (frame, Series or list/dict of frames), for rows/columns in
+        :param args: extra fields recorded with the span
+        """
+        stage = '.'.join(self._stack + [name])
+        span = Span(stage, args)
+        span.input(value)
+        self._stack.append(name)
+        memory = peak_rss()
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            seconds = time.perf_counter() - start
+            after = peak_rss()
+            self._stack.pop()
+            self._record(span, start, seconds, None if memory is None else after - memory)
+
+    def _record(self, span, start, seconds, memory):
+        record = {
+            'run': self.run, 'stage': span.stage, 'depth': len(self._stack),
+            'start': round(start - self._origin, 6), 'seconds': round(seconds, 6), 'peak_rss_delta': memory,
+            'rows_in': span.rows_in, 'columns_in': span.columns_in,
+            'rows_out': span.rows_out, 'columns_out': span.columns_out,
+            'rows_dropped': (span.rows_in - span.rows_out
+                             if span.rows_in is not None and span.rows_out is not None else None),
+        }
+        for key, value in span.args.items():
+            record.setdefault(key, value)
+        self.records.append(record)
+        if self._handle is not None:
+            self._handle.write(json.dumps(record, sort_keys=True, default=str) + '\n')
+
+    def chrome_trace(self):
+        """The spans as Chrome trace events (complete events, microseconds)."""
+        fields = ('seconds', 'start', 'run', 'stage', 'depth')
+        return {'traceEvents': [
+            {'name': record['stage'].rsplit('.', 1)[-1], 'cat': record['stage'].split('.', 1)[0], 'ph': 'X',
+             'ts': int(record['start'] * 1e6), 'dur': max(1, int(record['seconds'] * 1e6)),
+             'pid': os.getpid(), 'tid': 1,
+             'args': dict((key, value) for key, value in record.items() if key not in fields and value is not None)}
+            for record in self.records], 'displayTimeUnit': 'ms'}
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+        if self.chrome_path:
+            with open(self.chrome_path, 'w', encoding='utf-8') as handle:
+                json.dump(self.chrome_trace(), handle, default=str)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
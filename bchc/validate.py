@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Data-dictionary-driven validation of RESULT before it is written for import.
+
+  :notes:   The REDCap data dictionary (Project Setup > Data Dictionary > download, or the API
+            metadata export) is compiled once into per-field checks: allowed choice codes,
+            text validation type, numeric/date min and max. All checks then run as vectorized
+            column operations over RESULT and produce one error row per offending cell, plus
+            one row per column that REDCap does not know (e.g. a leftover all-caps pivot column).
+            This catches what the Data Import Tool would reject, without the round trip.
+"""
+import os
+import re
+
+import pandas as pd
+
+from bchc.redcap import API_URL, redcap_text
+
+# - Column names of the Data Dictionary CSV download, mapped to the API metadata names
+_DOWNLOAD_COLUMNS = {
+    'Variable / Field Name': 'field_name',
+    'Form Name': 'form_name',
+    'Field Type': 'field_type',
+    'Choices, Calculations, OR Slider Labels': 'select_choices_or_calculations',
+    'Text Validation Type OR Show Slider Number': 'text_validation_type_or_show_slider_number',
+    'Text Validation Min': 'text_validation_min',
+    'Text Validation Max': 'text_validation_max',
+}
+
+_DATE = r'\d{4}-\d{2}-\d{2}'
+VALIDATION_PATTERNS = {
+    'integer': r'-?\d+',
+    'number': r'-?(\d+(\.\d*)?|\.\d+)',
+    'date': _DATE,
+    'datetime': _DATE + r' \d{2}:\d{2}',
+    'datetime_seconds': _DATE + r' \d{2}:\d{2}:\d{2}',
+    'time': r'\d{2}:\d{2}',
+    'zipcode': r'\d{5}(-\d{4})?',
+    'phone': r'\(?\d{3}\)?[-. ]?\d{3}[-. ]?\d{4}',
+    'email': r'[^@\s]+@[^@\s]+\.[^@\s]+',
+    'alpha_only': r'[A-Za-z]+',
+}
+# - number, number_2dp, number_1dp_comma_decimal, ...: the fixed-decimal types need exactly N decimals
+_NUMBER = re.compile(r'number(?:_(\d)dp)?(_comma_decimal)?$')
+_FIXED_CHOICES = {'yesno': ('0', '1'), 'truefalse': ('0', '1')}
+_NOT_IMPORTABLE = ('calc', 'descriptive')
+_SYSTEM_FIELDS = ('redcap_event_name', 'redcap_repeat_instrument', 'redcap_repeat_instance',
+                  'redcap_data_access_group')
+
+
+def load_data_dictionary(path, token=None, url=API_URL, refresh=False):
+    """
+    Load the data dictionary CSV at ``path``.
+
+    When the file does not exist yet (or ``refresh`` is set) and an API token is given, the
+    dictionary is exported from REDCap first and saved to ``path`` as the local cache.
+
+    :returns: DataFrame with the API metadata column names
+    """
+    if token and (refresh or not os.path.exists(path)):
+        from bchc.redcap import export_metadata
+        text = export_metadata(token, url)
+        with open(path, 'w', encoding='utf-8', newline='') as handle:
+            handle.write(text)
+    dictionary = pd.read_csv(path, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+    return dictionary.rename(columns=_DOWNLOAD_COLUMNS)
+
+
+def _choice_codes(choices):
+    return tuple(item.split(',', 1)[0].strip() for item in choices.split('|') if item.strip())
+
+
+def _validation_kind(validation):
+    for kind in ('datetime_seconds', 'datetime', 'date'):
+        if validation.startswith(kind):
+            return kind
+    return validation
+
+
+def _validation_pattern(validation):
+    """Regex of a text validation type, or None for a type that is not checked."""
+    number = _NUMBER.match(validation)
+    if not number:
+        return VALIDATION_PATTERNS.get(validation)
+    point = ',' if number.group(2) else r'\.'
+    if number.group(1):
+        return r'-?\d+%s\d{%s}' % (point, number.group(1))
+    return r'-?(\d+(%s\d*)?|%s\d+)' % (point, point)
+
+
+def compile_checks(dictionary):
+    """
+    Precompile the per-field checks of a data dictionary.
+
+    :returns: dict of {column name: check dict} with any of the keys 'choices' (tuple of
+              codes), 'pattern' (compiled regex), 'min'/'max' (bounds), 'numeric' (bounds are
+              numbers rather than dates), 'comma_decimal' and 'not_importable'; checkbox fields are
+              expanded to their field___code columns, and each form contributes its <form>_complete
+              column
+    """
+    checks = {}
+    for row in dictionary.to_dict('records'):
+        field, kind = row['field_name'], row['field_type']
+        choices = row.get('select_choices_or_calculations', '')
+        validation = _validation_kind(row.get('text_validation_type_or_show_slider_number', ''))
+        checks['%s_complete' % row['form_name']] = {'choices': ('0', '1', '2')}
+
+        if kind == 'checkbox':
+            for code in _choice_codes(choices):
+                checks['%s___%s' % (field, code.lower())] = {'choices': ('0', '1')}
+            continue
+        check = {}
+        if kind in ('dropdown', 'radio'):
+            check['choices'] = _choice_codes(choices)
+        elif kind in _FIXED_CHOICES:
+            check['choices'] = _FIXED_CHOICES[kind]
+        elif kind == 'slider':
+            check.update(pattern=re.compile(VALIDATION_PATTERNS['integer']), min=0.0, max=100.0, numeric=True)
+        elif kind in _NOT_IMPORTABLE:
+            check['not_importable'] = True
+        elif kind == 'text' and _validation_pattern(validation):
+            check['pattern'] = re.compile(_validation_pattern(validation))
+            check['numeric'] = validation == 'integer' or bool(_NUMBER.match(validation))
+            if validation.endswith('_comma_decimal'):
+                check['comma_decimal'] = True
+            for bound in ('min', 'max'):
+                value = row.get('text_validation_%s' % bound, '').strip()
+                if value:
+                    check[bound] = float(value.replace(',', '.')) if check['numeric'] else value
+        checks[field] = check
+    return checks
+
+
+def validate_records(records, checks, record_id='alien_no'):
+    """
+    Run the compiled checks over every column of ``records``.
+
+    :returns: DataFrame of errors with columns record, field, value, error -- empty when the
+              data would pass the import
+    """
+    text = redcap_text(records)
+    ids = text[record_id] if record_id in text else pd.Series(text.index.astype(str), index=text.index)
+    errors = []
+
+    def report(field, bad, message):
+        if bad.any():
+            errors.append(pd.DataFrame({'record': ids[bad], 'field': field,
+                                        'value': text[field][bad], 'error': message}))
+
+    for field in text.columns:
+        if field == record_id or field in _SYSTEM_FIELDS:
+            continue
+        check = checks.get(field)
+        if check is None:
+            errors.append(pd.DataFrame({'record': [''], 'field': [field], 'value': [''],
+                                        'error': ['field not in data dictionary']}))
+            continue
+        values = text[field]
+        filled = values != ''
+        if check.get('not_importable'):
+            report(field, filled, 'calculated/descriptive field cannot be imported')
+            continue
+        if 'choices' in check:
+            report(field, filled & ~values.isin(check['choices']),
+                   'not one of the codes %s' % ', '.join(check['choices']))
+        if 'pattern' in check:
+            valid = values.str.fullmatch(check['pattern']).fillna(False).astype(bool)
+            report(field, filled & ~valid, 'does not match validation %r' % check['pattern'].pattern)
+            filled &= valid         # bounds only apply to well-formed values
+        if 'min' in check or 'max' in check:
+            bounds = values.where(filled)
+            if check.get('comma_decimal'):
+                bounds = bounds.str.replace(',', '.', regex=False)
+            if check.get('numeric'):
+                bounds = pd.to_numeric(bounds, errors='coerce')
+            if 'min' in check:
+                report(field, (bounds < check['min']).fillna(False).astype(bool), 'below minimum %s' % check['min'])
+            if 'max' in check:
+                report(field, (bounds > check['max']).fillna(False).astype(bool), 'above maximum %s' % check['max'])
+
+    if not errors:
+        return pd.DataFrame(columns=['record', 'field', 'value', 'error'])
+    return pd.concat(errors, ignore_index=True)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Vitals tab parsing -- blood pressure, height and weight checked column-wise, and one
+            encounter chosen per patient by date.
+
+  :notes:   The Vitals tab has a row per encounter. Rows are sorted by patient and Date (rows
+            without a date last) and the earliest -- or latest -- encounter is taken; a value
+            missing at that encounter is taken from the next one, as groupby().first() does.
+
+            BP is expected as 'systolic/diastolic' ('120/80', '120 / 80'); height in inches and
+            weight in pounds. Values that cannot be read -- 'refused', '120/', a BP Excel turned
+            into a date -- are blanked and listed in the bad-value report rather than stopping
+            the run, and so are non-positive heights and weights.
+"""
+import numpy as np
+import pandas as pd
+
+_BP = r'^\s*(\d{2,3})\s*/\s*(\d{2,3})\s*$'
+
+# - Bluegrass unit -> REDCap unit
+INCHES_TO_CM = 2.54
+POUNDS_TO_KG = 0.45
+
+
+def _text(values):
+    """Non-missing values as stripped strings (NaN stays NaN)."""
+    present = values.dropna()
+    return present.astype(str).str.strip().reindex(values.index)
+
+
+def parse_blood_pressure(values):
+    """
+    Split 'systolic/diastolic' readings.
+
+    :returns: (DataFrame with float systolic and diastolic columns, NaN where unreadable;
+               boolean Series marking readings present but unreadable)
+    """
+    text = _text(values)
+    # - readings repeat a lot, so each distinct one is parsed once and broadcast back
+    codes, uniques = pd.factorize(text)
+    distinct = pd.Series(uniques, dtype=object).str.extract(_BP).astype(float).to_numpy()
+    distinct = np.vstack([distinct, [[np.nan, np.nan]]])        # code -1 (missing) picks this row
+    parts = pd.DataFrame(distinct[codes], index=values.index, columns=['systolic', 'diastolic'])
+    bad = text.notna() & (text != '') & parts.systolic.isna()
+    return parts, bad
+
+
+def parse_measure(values):
+    """
+    Numeric height/weight.
+
+    :returns: (float Series, NaN where missing or unreadable; boolean Series marking values
+               present but not a positive number)
+    """
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        numbers, present = values.astype(float), values.notna()
+    else:
+        text = _text(values)
+        numbers = pd.to_numeric(text.mask(text == ''), errors='coerce')
+        present = text.notna() & (text != '')
+    positive = numbers > 0
+    return numbers.where(positive), present & ~positive
+
+
+def clean_vitals(vitals, encounter='first'):
+    """
+    One row of vitals per patient.
+
+    :param vitals: Vitals tab with Patient #, Date, Height, Weight, BP (BMI is ignored)
+    :param encounter: 'first' takes the earliest encounter, 'last' the latest
+    :returns: (frame indexed by Patient # with vsd1_height (cm), vsd1_weight (kg), vsd1_sys_bp
+               and vsd1_dia_bp; bad-value report with Patient #, Date, field, value)
+    """
+    if encounter not in ('first', 'last'):
+        raise ValueError("encounter must be 'first' or 'last', not %r" % (encounter,))
+
+    bp, bad_bp = parse_blood_pressure(vitals['BP'])
+    height, bad_height = parse_measure(vitals['Height'])
+    weight, bad_weight = parse_measure(vitals['Weight'])
+    frame = pd.DataFrame({
+        'Patient #': vitals['Patient #'],
+        'date': pd.to_datetime(vitals['Date'], errors='coerce'),
+        'vsd1_height': height * INCHES_TO_CM,
+        'vsd1_weight': weight * POUNDS_TO_KG,
+        'vsd1_sys_bp': bp.systolic,
+        'vsd1_dia_bp': bp.diastolic,
+    }, index=vitals.index)
+
+    frame = frame[frame['Patient #'].notna()]
+    # - undated rows go behind the dated ones of their patient: last for 'first', first for 'last'
+    frame = frame.sort_values(['Patient #', 'date'], kind='mergesort',
+                              na_position='last' if encounter == 'first' else 'first')
+    grouped = frame.drop(columns=['date']).groupby('Patient #', sort=True)
+    chosen = grouped.first() if encounter == 'first' else grouped.last()
+
+    problems = [(bad_bp, 'BP'), (bad_height, 'Height'), (bad_weight, 'Weight')]
+    bad = pd.concat([pd.DataFrame({'Patient #': vitals['Patient #'][mask], 'Date': vitals['Date'][mask],
+                                   'field': field, 'value': vitals[field][mask]})
+                     for mask, field in problems], ignore_index=True)
+    return chosen, bad
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Watch-folder service -- converts every new ARHCA workbook under the uploads
+            directory as soon as it has finished copying.
+
+  :notes:   The uploads tree is polled (a directory walk with one stat per workbook every few
+            seconds, which works the same on local disks and network shares). A workbook is
+            picked up once its size and modification time have stayed the same for `settle`
+            seconds and it can be opened, so files still being copied or saved are left alone.
+
+            Ready workbooks go to a pool of worker processes that import the pipeline once at
+            start-up and stay warm. Each conversion writes refHealthUpload_<m-yyyy>.csv next to
+            the workbook and a <workbook>.status.json file recording the outcome (state,
+            records, review counts, error) and a <workbook>.trace.jsonl with the time and rows in/out
+            of every step (see bchc/trace.py). A workbook whose status file matches its current
+            size and modification time is not processed again; replacing the file reprocesses it.
+
+            A worker that dies (e.g. out of memory on a multi-year workbook) breaks the whole
+            pool, failing every conversion in flight. The pool is then rebuilt and those
+            workbooks are requeued and run one at a time: the one that kills a worker again on
+            its own is marked 'error', the others are converted as usual.
+
+            Usage:  python -m bchc.watch "C:\\path\\to\\uploads" [--interval 5] [--workers 2]
+"""
+import argparse
+import fnmatch
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+PATTERNS = ('ARHCA_*.xls', 'ARHCA_*.xlsx')
+STATUS_SUFFIX = '.status.json'
+TRACE_SUFFIX = '.trace.jsonl'
+
+
+def status_path(workbook):
+    """<workbook without extension>.status.json"""
+    return os.path.splitext(workbook)[0] + STATUS_SUFFIX
+
+
+def read_status(workbook):
+    try:
+        with open(status_path(workbook), encoding='utf-8') as handle:
+            return json.load(handle)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def write_status(workbook, status):
+    path = status_path(workbook)
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'w', encoding='utf-8') as handle:
+        json.dump(status, handle, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def signature(path):
+    """(size, mtime in ns) of ``path``, or None when it vanished."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def find_workbooks(root, patterns=PATTERNS):
+    """Every workbook under ``root`` matching one of ``patterns``, skipping Excel lock files."""
+    found = []
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if not name.startswith('~$') and any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                found.append(os.path.join(directory, name))
+    return sorted(found)
+
+
+def _warm():
+    import bchc.pipeline  # noqa: F401 -- pay the pandas/pipeline import once per worker
+
+
+def convert_workbook(path):
+    """Worker job: process one workbook, write its upload CSV, return a summary dict."""
+    from bchc.cli import default_output
+    from bchc.pipeline import process_workbook
+    from bchc.trace import Tracer
+    from bchc.writer import write_upload_csv
+
+    report = {}
+    with Tracer(os.path.splitext(path)[0] + TRACE_SUFFIX) as tracer:
+        result = process_workbook(path, max_workers=1, report=report, tracer=tracer)
+        output = default_output(path)
+        write_upload_csv(result, output, tracer=tracer)
+    return {
+        'output': output,
+        'records': len(result),
+        'alien_invalid': len(report['alien_invalid']),
+        'alien_conflicts': len(report['alien_conflicts']),
+        'vitals_bad': len(report['vitals_bad']),
+        'medcin_conflicts': len(report['medcin_conflicts']),
+        'lab_review': len(report['lab_review']),
+        'lab_not_numeric': len(report['lab_not_numeric']),
+        'lab_out_of_range': len(report['lab_out_of_range']),
+        'order_unknown': len(report['order_unknown']),
+        'immun_unknown': len(report['immun_unknown']),
+        'unmapped': sum(len(fields) for fields in report['unmapped'].values()),
+    }
+
+
+def _log(message):
+    print('%s %s' % (time.strftime('%Y-%m-%d %H:%M:%S'), message))
+    sys.stdout.flush()
+
+
+class Watcher(object):
+    """Polls ``root`` and hands settled, unprocessed workbooks to a warm worker pool."""
+
+    def __init__(self, root, settle=5.0, max_workers=2, patterns=PATTERNS):
+        self.root = root
+        self.settle = settle
+        self.patterns = patterns
+        self.max_workers = max_workers
+        self.pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_warm)
+        self.seen = {}          # path -> (signature, time it was first seen with it)
+        self.running = {}       # future -> (path, signature, start time)
+        self.pending = []       # (path, signature) requeued after a worker died
+        self.suspects = set()   # paths running when a worker died; they run alone until they finish
+        self.broken = False
+
+    def _restart(self):
+        self.pool.shutdown(wait=False)
+        self.pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_warm)
+        self.broken = False
+        _log('worker process died; pool restarted')
+
+    def _done(self, path, sig):
+        status = read_status(path)
+        return status is not None and status.get('signature') == list(sig) and status.get('state') != 'processing'
+
+    def ready(self, now=None):
+        """Workbooks whose size/mtime settled, that are not processed or being processed."""
+        now = time.time() if now is None else now
+        busy = set(path for path, _, _ in self.running.values()) | set(path for path, _ in self.pending)
+        ready = []
+        for path in find_workbooks(self.root, self.patterns):
+            sig = signature(path)
+            if sig is None or path in busy or self._done(path, sig):
+                self.seen.pop(path, None)
+                continue
+            previous = self.seen.get(path)
+            if previous is None or previous[0] != sig:
+                self.seen[path] = (sig, now)        # new or still changing: start the settle clock
+                continue
+            if now - previous[1] < self.settle:
+                continue
+            try:
+                open(path, 'rb').close()            # Excel/copy still holding the file on Windows
+            except (IOError, OSError):
+                continue
+            ready.append((path, sig))
+        return ready
+
+    def submit(self, path, sig):
+        start = time.time()
+        write_status(path, {'workbook': path, 'signature': list(sig), 'state': 'processing',
+                            'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start))})
+        try:
+            future = self.pool.submit(convert_workbook, path)
+        except BrokenProcessPool:
+            self._restart()
+            future = self.pool.submit(convert_workbook, path)
+        self.running[future] = (path, sig, start)
+        self.seen.pop(path, None)
+        _log('processing %s' % path)
+
+    def collect(self):
+        """Record the outcome of finished conversions; returns their status dicts."""
+        finished = []
+        done = [future for future in self.running if future.done()]
+        broken = [future for future in done if isinstance(future.exception(), BrokenProcessPool)]
+        for future in done:
+            path, sig, start = self.running.pop(future)
+            if future in broken:
+                self.broken = True
+                if path not in self.suspects or len(broken) > 1 or self.running:
+                    # - any of the workbooks in flight may have killed the worker: run each alone
+                    self.suspects.add(path)
+                    self.pending.append((path, sig))
+                    _log('requeued %s' % path)
+                    continue
+            status = {'workbook': path, 'signature': list(sig),
+                      'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start)),
+                      'seconds': round(time.time() - start, 3)}
+            self.suspects.discard(path)
+            try:
+                status.update(future.result(), state='done', error='')
+                _log('done %s -> %s (%d records)' % (path, status['output'], status['records']))
+            except BrokenProcessPool:
+                status.update(state='error', error='BrokenProcessPool: the worker process died converting '
+                                                   'this workbook (out of memory?)')
+                _log('error %s: %s' % (path, status['error']))
+            except Exception as error:
+                status.update(state='error', error='%s: %s' % (type(error).__name__, error))
+                _log('error %s: %s' % (path, status['error']))
+            write_status(path, status)
+            finished.append(status)
+        return finished
+
+    def poll(self):
+        """One pass: collect finished work, then submit everything that is ready."""
+        finished = self.collect()
+        if self.broken:
+            self._restart()
+        # - a suspect runs alone, so that a worker dying again points at it
+        if self.pending and not self.running:
+            self.submit(*self.pending.pop(0))
+        if any(path in self.suspects for path, _, _ in self.running.values()):
+            return finished
+        for path, sig in self.ready():
+            self.submit(path, sig)
+        return finished
+
+    def run(self, interval=5.0):
+        _log('watching %s' % os.path.abspath(self.root))
+        try:
+            while True:
+                self.poll()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            _log('stopping; waiting for %d running conversions' % len(self.running))
+        finally:
+            self.pool.shutdown(wait=True)
+            self.collect()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bchc.watch',
+                                     description='Convert new ARHCA workbooks under a directory as they arrive.')
+    parser.add_argument('root', help='uploads directory to watch (searched recursively)')
+    parser.add_argument('--interval', type=float, default=5.0, help='seconds between scans')
+    parser.add_argument('--settle', type=float, default=5.0,
+                        help='seconds a workbook must stay unchanged before it is processed')
+    parser.add_argument('--workers', type=int, default=2, help='worker processes')
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.root):
+        parser.error('not a directory: %s' % args.root)
+
+    Watcher(args.root, args.settle, args.workers).run(args.interval)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
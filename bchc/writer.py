@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Writer for the REDCap import file -- CSV or REDCap JSON, written a chunk of rows at
+            a time and split into several files when asked.
+
+  :notes:   RESULT keeps missing values as NA in typed columns (bchc/dtypes.py). REDCap's
+            convention -- missing values as empty cells, dates as YYYY-MM-DD, whole numbers
+            without a decimal part -- is applied here, while the file is written, through the
+            same rendering the API client uses (redcap.redcap_text). Only `chunk_size` rows are
+            rendered as text at a time, so writing does not hold a text copy of RESULT.
+
+            The Data Import Tool struggles with very large files. With max_rows and/or
+            max_bytes (of uncompressed text) the output is split into files of at most that
+            size, each a complete import file with its own header (CSV) or array (JSON):
+            refHealthUpload_3-2018_1.csv, refHealthUpload_3-2018_2.csv, ... When everything fits
+            in one file it keeps the name it was given. compress=True gzips every file
+            (.gz is added to the name); unzip before importing.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+
+import numpy as np
+
+from bchc.redcap import redcap_text
+from bchc.trace import NULL_TRACER
+
+FORMATS = ('csv', 'json')
+CHUNK_ROWS = 20000       # rows rendered as text at a time; smaller chunks pay more per-column overhead
+
+
+def part_path(path, number):
+    """Name of file ``number`` (from 1) of a split upload: upload.csv.gz -> upload_2.csv.gz."""
+    stem, gz = (path[:-3], '.gz') if path.endswith('.gz') else (path, '')
+    stem, extension = os.path.splitext(stem)
+    return '%s_%d%s%s' % (stem, number, extension, gz)
+
+
+class _Part(object):
+    """One output file being written."""
+
+    def __init__(self, path, format, compress):
+        self.path = path
+        self.rows = 0
+        self.bytes = 0
+        self.handle = gzip.open(path, 'wb') if compress else open(path, 'wb')
+        self.closing = b']' if format == 'json' else b''
+        if format == 'json':
+            self.write(b'[')
+
+    def write(self, data):
+        self.handle.write(data)
+        self.bytes += len(data)
+
+    def close(self):
+        if not self.handle.closed:
+            self.write(self.closing)
+            self.handle.close()
+
+
+def _render(chunk, format):
+    """
+    The rows of ``chunk`` as UTF-8 text, each on its own so that a file can be cut between any
+    two of them.
+
+    :returns: (CSV header line or b'' for JSON, list of the rows' bytes -- a JSON record carries
+               its leading separator, which the first record of a file drops)
+    """
+    text = redcap_text(chunk)
+    if format == 'json':
+        return b'', [(', ' + json.dumps(record, ensure_ascii=False)).encode('utf-8')
+                     for record in text.to_dict('records')]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator=os.linesep)      # as DataFrame.to_csv writes it
+    writer.writerow([str(column) for column in text.columns])
+    ends = [buffer.tell()]
+    for row in text.itertuples(index=False, name=None):
+        writer.writerow(row)
+        ends.append(buffer.tell())
+    rendered = buffer.getvalue()
+    return rendered[:ends[0]].encode('utf-8'), [rendered[start:stop].encode('utf-8')
+                                                for start, stop in zip(ends[:-1], ends[1:])]
+
+
+def write_upload(frame, path, format='csv', chunk_size=CHUNK_ROWS, max_rows=None, max_bytes=None, compress=False,
+                 tracer=NULL_TRACER):
+    """
+    Write ``frame`` as REDCap import file(s).
+
+    :param frame: RESULT, record id first
+    :param path: output file; the parts of a split upload are named after it (see part_path)
+    :param format: 'csv' (Data Import Tool) or 'json' (a REDCap JSON array of records)
+    :param chunk_size: rows rendered as text at a time
+    :param max_rows: most records per file
+    :param max_bytes: most bytes per file, counted before compression; a file always takes at
+                      least one record, even one larger than the budget
+    :param compress: gzip every file, adding .gz to the names
+    :param tracer: trace.Tracer recording the write
+    :returns: list of the files written
+    """
+    if format not in FORMATS:
+        raise ValueError('format must be one of %s, not %r' % (', '.join(FORMATS), format))
+    path = str(path)
+    if compress and not path.endswith('.gz'):
+        path += '.gz'
+    separator = 2 if format == 'json' else 0       # ', ' before every JSON record but a file's first
+
+    with tracer.span('write', frame, path=path, format=format) as span:
+        parts = [_Part(path, format, compress)]
+        try:
+            if not len(frame):
+                parts[0].write(_render(frame, format)[0])
+            for start in range(0, len(frame), chunk_size):
+                header, rows = _render(frame.iloc[start:start + chunk_size], format)
+                # - each chunk is rendered once and cut where the budget runs out, using the
+                #   running total of its rows' sizes; the rest goes on to the next file
+                sizes = np.cumsum([len(row) for row in rows])
+                done = 0
+                while done < len(rows):
+                    part = parts[-1]
+                    first = part.rows == 0
+                    room = len(rows) - done
+                    if max_rows:
+                        room = min(room, max_rows - part.rows)
+                    if max_bytes:
+                        budget = max_bytes - part.bytes - len(part.closing)
+                        if first:
+                            budget -= len(header) - separator
+                        spent = sizes[done - 1] if done else 0
+                        room = min(room, int(np.searchsorted(sizes[done:], budget + spent, side='right')))
+                    if room == 0 and first:
+                        room = 1            # a single record larger than the budget gets a file of its own
+                    if room == 0:
+                        parts.append(_Part(part_path(path, len(parts) + 1), format, compress))
+                        continue
+                    data = b''.join(rows[done:done + room])
+                    part.write(header + data[separator:] if first else data)
+                    part.rows += room
+                    done += room
+        finally:
+            for part in parts:
+                part.close()
+
+        if len(parts) > 1:
+            os.replace(path, part_path(path, 1))
+            parts[0].path = part_path(path, 1)
+        span.output(frame)
+        span.set(files=len(parts), bytes=sum(part.bytes for part in parts))
+    return [part.path for part in parts]
+
+
+def write_upload_csv(frame, path, tracer=NULL_TRACER, **options):
+    """
+    Write ``frame`` as a REDCap import CSV.
+
+    :param options: chunk_size, max_rows, max_bytes or compress, see write_upload
+    :returns: ``path`` when everything went into one file, otherwise the list of files written
+    """
+    paths = write_upload(frame, path, 'csv', tracer=tracer, **options)
+    return paths[0] if len(paths) == 1 else paths
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Shared fixtures: a synthetic ARHCA workbook (bchc/synth.py), its RESULT frame and a
+            REDCap stand-in (bchc/standin.py) -- no real patient data and no network.
+"""
+import threading
+
+import pytest
+
+from bchc.labs import load_alias_store
+from bchc.pipeline import process_sheets
+from bchc.standin import StandinProject, make_server
+from bchc.synth import generate_sheets, write_workbook
+
+PATIENTS = 200
+TOKEN = 'TEST'
+
+
+@pytest.fixture(scope='session')
+def sheets():
+    return generate_sheets(PATIENTS, seed=1)
+
+
+@pytest.fixture(scope='session')
+def workbook(sheets, tmp_path_factory):
+    return str(write_workbook(sheets, str(tmp_path_factory.mktemp('workbooks') / 'ARHCA_1-2018.xlsx')))
+
+
+@pytest.fixture
+def aliases(tmp_path):
+    """A fresh alias store for each run: the seed store, with what a run learns kept in tmp_path
+    rather than in the user's ~/.bchc."""
+    return lambda: load_alias_store(str(tmp_path / 'lab_aliases.json'))
+
+
+@pytest.fixture(scope='session')
+def result(sheets, tmp_path_factory):
+    return process_sheets(sheets, lab_aliases=load_alias_store(str(tmp_path_factory.mktemp('aliases') / 'a.json')))
+
+
+@pytest.fixture
+def redcap():
+    """(API url, StandinProject) of a stand-in server running for the test."""
+    project = StandinProject(TOKEN)
+    server = make_server(project)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield 'http://%s:%d/api/' % server.server_address[:2], project
+    finally:
+        server.shutdown()
+        server.server_close()
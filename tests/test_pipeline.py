@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Workbook -> RESULT: tab detection, streamed Orders and the stage memo.
+"""
+import pandas as pd
+
+from bchc import immun
+from bchc.pipeline import process_workbook
+from bchc.sheets import SHEETS, detect_sheets
+from bchc.synth import write_workbook
+
+# - every tab away from its usual position (SHEETS), filler tabs in between
+SHUFFLED = {'demographics': 5, 'user_fields': 0, 'medcin': 9, 'orders': 1, 'vitals': 3, 'immunizations': 7}
+
+
+def test_detect_sheets_usual_positions(workbook):
+    assert detect_sheets(workbook, use_cache=False) == SHEETS
+
+
+def test_detect_sheets_shuffled_tabs(sheets, workbook, aliases, tmp_path):
+    shuffled = write_workbook(sheets, str(tmp_path / 'ARHCA_2-2018.xlsx'), SHUFFLED)
+    assert detect_sheets(shuffled, use_cache=False) == SHUFFLED
+
+    expected = process_workbook(workbook, max_workers=1, use_cache=False, lab_aliases=aliases())
+    result = process_workbook(shuffled, max_workers=1, use_cache=False, lab_aliases=aliases())
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_stream_orders_matches_parsed(workbook, aliases):
+    parsed, streamed = {}, {}
+    expected = process_workbook(workbook, max_workers=1, use_cache=False, report=parsed, lab_aliases=aliases())
+    result = process_workbook(workbook, max_workers=1, use_cache=False, report=streamed, lab_aliases=aliases(),
+                              stream=True, chunk_size=500)
+    pd.testing.assert_frame_equal(result, expected)
+    for table in ('lab_review', 'order_unknown'):
+        pd.testing.assert_frame_equal(streamed[table], parsed[table])
+    assert sorted(streamed['filter_hits']) == sorted(parsed['filter_hits'])
+    for name, hits in parsed['filter_hits'].items():
+        pd.testing.assert_series_equal(streamed['filter_hits'][name], hits)
+
+
+def test_memo_reuse_and_invalidation(workbook, aliases, tmp_path, monkeypatch):
+    def run():
+        report = {}
+        result = process_workbook(workbook, max_workers=1, cache_dir=str(tmp_path / 'cache'), report=report,
+                                  lab_aliases=aliases())
+        return result, report
+
+    expected, report = run()
+    assert set(report['stages'].values()) == {'ran'}
+
+    result, report = run()
+    assert set(report['stages'].values()) == {'reused'}
+    pd.testing.assert_frame_equal(result, expected)
+
+    # - a vaccine dropped from the registry reruns Immunizations and what is downstream of it only
+    counts = pd.read_excel(workbook, sheet_name=SHEETS['immunizations'])['Description'].value_counts()
+    vaccine = next(description for description in counts.index if description in immun.VACCINE_REGISTRY)
+    monkeypatch.delitem(immun.VACCINE_REGISTRY, vaccine)
+    result, report = run()
+    assert sorted(name for name, status in report['stages'].items() if status == 'ran') == \
+        ['assemble', 'finish', 'immunizations']
+    assert vaccine in set(report['immun_unknown']['Description'])
+
+    monkeypatch.undo()
+    result, report = run()
+    assert set(report['stages'].values()) == {'reused'}
+    pd.testing.assert_frame_equal(result, expected)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: Import and delta upload against the REDCap stand-in (bchc/standin.py).
+"""
+import pandas as pd
+import pytest
+
+from bchc.redcap import delta_upload, export_records, import_records, redcap_text
+
+from conftest import TOKEN
+
+
+def _stored(result, url):
+    """What the stand-in holds for the records and fields of ``result``, as text in its order."""
+    fields = [column for column in result.columns if column != 'alien_no']
+    current = export_records(result['alien_no'], fields, TOKEN, url, batch_size=60, max_workers=2)
+    return current.set_index('alien_no').reindex(redcap_text(result)['alien_no'])[fields].reset_index()
+
+
+def _expected(result):
+    return redcap_text(result).reset_index(drop=True)
+
+
+def test_import_round_trip(result, redcap):
+    url, project = redcap
+    log = import_records(result, TOKEN, url, chunk_size=60, max_workers=2)
+    assert list(log['status'].unique()) == ['ok']
+    assert log['records'].sum() == log['imported'].sum() == len(result)
+    assert len(project.records) == len(result)
+    pd.testing.assert_frame_equal(_stored(result, url), _expected(result), check_names=False)
+
+
+def test_import_rejected_token_is_not_retried(result, redcap):
+    url, project = redcap
+    log = import_records(result.head(5), 'WRONG', url, backoff=0)
+    assert list(log['status']) == ['error']
+    assert list(log['attempts']) == [1]
+    assert 'HTTP 403' in log['error'][0]
+    assert not project.records
+
+
+def test_delta_upload_sends_only_changes(result, redcap):
+    url, project = redcap
+    import_records(result, TOKEN, url, chunk_size=60, max_workers=2)
+
+    changed = result.copy()
+    changed['name'] = changed['name'].astype(object)
+    changed.iloc[:3, changed.columns.get_loc('name')] = 'CHANGED'
+    cleared = changed['date_of_birth'].notna().to_numpy().nonzero()[0][0]
+    changed.iloc[cleared, changed.columns.get_loc('date_of_birth')] = pd.NaT
+
+    log, summary = delta_upload(changed, TOKEN, url, batch_size=60, chunk_size=60, max_workers=2)
+    assert summary['new_records'] == 0
+    assert summary['changed_records'] == 3
+    assert summary['changed_cells'] == 3
+    assert summary['cleared_cells'] == 1
+    assert log['imported'].sum() == 3
+
+    # - the change arrives, and the cleared cell keeps its stored value ('normal' never blanks)
+    expected = _expected(changed)
+    expected.loc[cleared, 'date_of_birth'] = _expected(result).loc[cleared, 'date_of_birth']
+    pd.testing.assert_frame_equal(_stored(changed, url), expected, check_names=False)
+
+    log, summary = delta_upload(changed, TOKEN, url, batch_size=60, max_workers=2)
+    assert summary['changed_cells'] == 0 and summary['cleared_cells'] == 1
+    assert log.empty
+
+
+def test_delta_upload_refuses_overwrite(result, redcap):
+    url, project = redcap
+    with pytest.raises(ValueError):
+        delta_upload(result, TOKEN, url, overwrite='overwrite')
+    assert project.requests == 0
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+ :synopsis: The REDCap import file: split uploads put back together give the unsplit one.
+"""
+import gzip
+import io
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from bchc.writer import part_path, write_upload
+
+
+def _read(path, format):
+    with (gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')) as handle:
+        data = handle.read()
+    if format == 'json':
+        return pd.DataFrame(json.loads(data.decode('utf-8')), dtype=str)
+    return pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False)
+
+
+@pytest.mark.parametrize('format', ['csv', 'json'])
+def test_unsplit_upload_keeps_its_name(result, tmp_path, format):
+    path = str(tmp_path / ('upload.%s' % format))
+    assert write_upload(result, path, format) == [path]
+    assert len(_read(path, format)) == len(result)
+
+
+@pytest.mark.parametrize('format', ['csv', 'json'])
+@pytest.mark.parametrize('split', [{'max_rows': 70}, {'max_bytes': 20000}, {'max_rows': 30, 'max_bytes': 8000}])
+def test_split_upload_reassembles(result, tmp_path, format, split):
+    whole = _read(write_upload(result, str(tmp_path / ('whole.%s' % format)), format)[0], format)
+    path = str(tmp_path / ('upload.%s' % format))
+    files = write_upload(result, path, format, chunk_size=45, **split)
+
+    assert len(files) > 1
+    assert files == [part_path(path, number) for number in range(1, len(files) + 1)]
+    assert not os.path.exists(path)
+    parts = [_read(name, format) for name in files]
+    for part in parts:
+        assert len(part) <= split.get('max_rows', len(result))
+    if 'max_bytes' in split:
+        assert max(os.path.getsize(name) for name in files) <= split['max_bytes']
+    pd.testing.assert_frame_equal(pd.concat(parts, ignore_index=True), whole)
+
+
+def test_split_upload_compressed(result, tmp_path):
+    whole = _read(write_upload(result, str(tmp_path / 'whole.csv'))[0], 'csv')
+    files = write_upload(result, str(tmp_path / 'upload.csv'), max_bytes=20000, compress=True)
+    assert all(name.endswith('.gz') for name in files)
+    pd.testing.assert_frame_equal(pd.concat([_read(name, 'csv') for name in files], ignore_index=True), whole)
+
+
+def test_record_larger_than_the_budget_gets_its_own_file(result, tmp_path):
+    files = write_upload(result.head(3), str(tmp_path / 'upload.csv'), max_bytes=10)
+    assert [len(_read(name, 'csv')) for name in files] == [1, 1, 1]